@@ -0,0 +1,148 @@
+import os
+import sys
+import argparse
+import traceback
+from typing import NamedTuple
+from concurrent.futures import ProcessPoolExecutor
+
+from tool_scanner import scan, expand_paths
+from convert_legacy import load_tools_map, convert_post
+from generate_hex_v5 import (BuildOptions, BuildError, BuildCache, add_build_arguments, build_post, validate_post,
+                             find_calculator_ids, post_key)
+
+# Batch build: scan -> convert (Rule 8) -> build payload -> inject, for every post in a
+# directory or glob, one post per worker process. A post that fails is reported and
+# left untouched; the others still build. Results print in path order, whatever order
+# the workers finish in. With a build cache, posts whose inputs haven't changed are skipped
+# and workers share encoded payloads through the cache directory.
+
+
+class PostResult(NamedTuple):
+    path: str
+    ok: bool
+    changed: bool     # the built post differs from the file on disk
+    skipped: bool     # no calculators and no loader: not a calculator post, left alone
+    converted: int    # legacy blocks replaced
+    calculators: int
+    size: int         # bytes of the built post
+    problems: list    # validate_post() warnings
+    error: str        # None on success
+    log: list
+
+
+def available_cores():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def build_one(path, options, tools_map, write=True, cache_dir=None):
+    """Build one post in place; never raises, so one bad post can't stop the batch."""
+    log = []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            original = f.read()
+
+        blocks = scan(original)
+        legacy = [b for b in blocks if b.kind != 'container']
+        content = original
+        converted = 0
+        if legacy:
+            # Definitions found in the post itself count as scanned (scan_wet), on top of the dump:
+            # only <code class="itb-tool"> blocks and [itb-tool] shortcodes define tools
+            post_map = dict(tools_map)
+            post_map.update((b.tool_id, b.data) for b in legacy
+                            if b.kind in ('pre', 'shortcode') and b.data is not None)
+            content = convert_post(original, post_map, blocks, log=log.append)
+            converted = len(legacy) - sum(b.kind != 'container' for b in scan(content))
+
+        # Posts without calculators or a loader aren't calculator posts: don't give them a payload
+        if not find_calculator_ids(content) and '<!-- OZ Calc' not in content:
+            log.append("No calculators and no loader block: skipped")
+            return PostResult(path, True, False, True, converted, 0, len(original.encode('utf-8')), [], None, log)
+
+        cache = BuildCache(cache_dir) if cache_dir else None
+        key = post_key(options, content) if cache else None
+        if key and cache.is_current(key, original):
+            log.append("Build cache: unchanged since its last build")
+            final_content = original
+        else:
+            final_content = build_post(content, options, log=log.append, cache=cache)
+        problems = validate_post(final_content)
+        changed = final_content != original
+        if changed and write:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(final_content)
+        if key and (write or not changed):
+            cache.put_post(key, final_content)
+        return PostResult(path, True, changed, False, converted, len(find_calculator_ids(final_content)),
+                          len(final_content.encode('utf-8')), problems, None, log)
+    except BuildError as e:
+        return PostResult(path, False, False, False, 0, 0, 0, [], str(e), log)
+    except Exception as e:
+        log.append(traceback.format_exc().rstrip())
+        return PostResult(path, False, False, False, 0, 0, 0, [], f"{type(e).__name__}: {e}", log)
+
+
+def build_all(paths, options, tools_map=None, jobs=None, write=True, cache_dir=None):
+    """PostResults for paths, in the order given."""
+    tools_map = tools_map or {}
+    jobs = jobs or available_cores()
+    if jobs == 1 or len(paths) < 2:
+        return [build_one(path, options, tools_map, write, cache_dir) for path in paths]
+
+    with ProcessPoolExecutor(max_workers=min(jobs, len(paths))) as pool:
+        futures = [pool.submit(build_one, path, options, tools_map, write, cache_dir) for path in paths]
+        results = []
+        for path, future in zip(paths, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                # The worker itself died (killed, out of memory); build_one catches everything else
+                results.append(PostResult(path, False, False, False, 0, 0, 0, [], f"worker failed: {type(e).__name__}: {e}", []))
+        return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert, build and inject every post in a directory or glob.")
+    parser.add_argument('posts', nargs='+', help="Post files, directories (every *.html below) or globs")
+    parser.add_argument('--tools', help="Scanner dump (found_tools_*.json) for shortcodes and placeholders that carry only an ID")
+    parser.add_argument('--jobs', '-j', type=int, default=None, help="Worker processes (default: available cores)")
+    parser.add_argument('--dry-run', action='store_true', help="Build and validate, but don't write any post")
+    parser.add_argument('--verbose', '-v', action='store_true', help="Print each post's full build log")
+    add_build_arguments(parser)
+    args = parser.parse_args(argv)
+
+    options = BuildOptions.from_args(args)
+    tools_map = load_tools_map(args.tools) if args.tools else {}
+    paths = expand_paths(args.posts)
+    if not paths:
+        print("No posts found.")
+        return 1
+
+    results = build_all(paths, options, tools_map, args.jobs, write=not args.dry_run,
+                        cache_dir=None if args.no_build_cache else args.build_cache)
+
+    for r in results:
+        if r.ok and r.skipped:
+            print(f"SKIP  {r.path}: skipped, no calculators")
+        elif r.ok:
+            state = 'updated' if r.changed and not args.dry_run else 'would update' if r.changed else 'unchanged'
+            print(f"OK    {r.path}: {state}, {r.calculators} calculators, {r.converted} converted, {r.size} bytes")
+            for problem in r.problems:
+                print(f"      Warning: {problem}")
+        else:
+            print(f"FAIL  {r.path}: {r.error}")
+        if args.verbose or not r.ok:
+            for line in r.log:
+                print(f"      {line}")
+
+    failed = sum(not r.ok for r in results)
+    skipped = sum(r.skipped for r in results)
+    print(f"Built {len(results) - failed - skipped}/{len(results)} posts ({failed} failed, {skipped} skipped).")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,12 +1,11 @@
 
-import re
 import json
 
+from tool_scanner import scan, slugify
+
 # This script finds legacy JSON tool definitions in errorpost.html
 # and replaces them with Level 5 HTML Calculator structures.
-
-def slugify(text):
-    return re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-')
+# Importable: batch_build.py calls load_tools_map() and convert_post() per post.
 
 def generate_html(tool_id, data):
     title = data.get('title_en', data.get('name', tool_id))
@@ -39,9 +38,11 @@ def generate_html(tool_id, data):
             field_html = f'<select data-var="{name}">{opts}</select>'
         else:
             if inp.get('type') == 'number':
-                val = str(inp.get('min', 0))
+                val = str(inp.get('value', inp.get('min', 0)))
                 step = str(inp.get('step', 1))
-                field_html = f'<input type="number" data-var="{name}" value="{val}" step="{step}">'
+                # min/max let the engine clamp the value (it coerces number fields once, in JS)
+                bounds = ''.join(f' {k}="{inp[k]}"' for k in ('min', 'max') if k in inp)
+                field_html = f'<input type="number" data-var="{name}" value="{val}"{bounds} step="{step}">'
             else:
                 field_html = f'<input type="text" data-var="{name}" placeholder="..."> '
 
@@ -61,10 +62,18 @@ def generate_html(tool_id, data):
     for out in data.get('outputs', []):
         key = out.get('name', out.get('id', 'unknown'))
         label = out.get('label', key)
+        # Formatting hints; the engine applies them when a formula returns a raw number
+        attrs = ''
+        for field in ('format', 'unit', 'precision'):
+            if field in out:
+                attrs += f' data-itb-{field}="{out[field]}"'
+        # Inputs (or earlier outputs) this output depends on, for split formulas
+        if out.get('deps'):
+            attrs += f' data-itb-deps="{" ".join(out["deps"])}"'
         html += f"""
         <div class="itb-output-group">
             <label>{label}:</label>
-            <strong data-itb-output="{key}">-</strong>
+            <strong data-itb-output="{key}"{attrs}>-</strong>
         </div>"""
 
     html += """
@@ -72,44 +81,76 @@ def generate_html(tool_id, data):
 </div>"""
     return html
 
-# Read file
-with open('found_tools_phase9.json', 'r', encoding='utf-8') as f:
-    tools_data = json.load(f)
-
-tools_map = {}
-for t in tools_data:
-    if 'id' not in t:
-        t['id'] = slugify(t.get('name', 'tool'))
-    tools_map[t['id']] = t
-
-with open('errorpost.html', 'r', encoding='utf-8') as f:
-    content = f.read()
-
-# Replace <pre> blocks
-# Regex to find <pre ...><code class="itb-tool">{...}</code></pre>
-matches = re.findall(r'(<pre[^>]*><code class="itb-tool">\s*({.*?})\s*</code></pre>)', content, re.DOTALL)
-
-print(f"Found {len(matches)} blocks to replace.")
-
-new_content = content
-
-for full_match, json_str in matches:
-    try:
-        data = json.loads(json_str)
-        tid = data.get('id')
-        if not tid:
-            tid = slugify(data.get('name', 'tool'))
-            
-        if tid in tools_map:
-            print(f"Converting {tid}...")
-            new_html = generate_html(tid, data)
-            new_content = new_content.replace(full_match, new_html)
-        else:
-            print(f"Warning: Tool ID {tid} not found in map.")
-    except Exception as e:
-        print(f"Error parsing match: {e}")
-
-with open('errorpost.html', 'w', encoding='utf-8') as f:
-    f.write(new_content)
-
-print("Conversion complete.")
+def load_tools_map(path='found_tools_phase9.json'):
+    """Tool definitions from a scanner dump, keyed by ID (Rule 12: slug of the name when it has none)."""
+    with open(path, 'r', encoding='utf-8') as f:
+        tools_data = json.load(f)
+
+    tools_map = {}
+    for t in tools_data:
+        if 'id' not in t:
+            t['id'] = slugify(t.get('name', 'tool'))
+        tools_map[t['id']] = t
+    return tools_map
+
+
+def convert_post(content, tools_map, blocks=None, log=print):
+    """Replace the legacy blocks (Rule 8) of content with Level 5 HTML; returns the new content.
+
+    blocks is tool_scanner.scan(content), if the caller already has it.
+    """
+    # <pre> JSON, [itb-tool] shortcodes, data-itb-tool placeholders
+    blocks = scan(content) if blocks is None else blocks
+    legacy = [b for b in blocks if b.kind != 'container']
+    converted = {b.tool_id for b in blocks if b.kind == 'container'}
+
+    log(f"Found {len(legacy)} blocks to replace.")
+
+    def convert_block(block):
+        """Level 5 HTML (bytes) for one legacy block, or None to leave it as it is."""
+        tid = block.tool_id
+        if tid is None:
+            log(f"Error parsing match: invalid tool JSON at byte {block.start}")
+            return None
+        if tid not in tools_map:
+            log(f"Warning: Tool ID {tid} not found in map.")
+            return None
+        if tid in converted:
+            log(f"Warning: {tid} already has a calculator in this post (Rule 19: check for duplicates).")
+        log(f"Converting {tid}...")
+        # Shortcodes and placeholders carry only the ID; the definition comes from the JSON dump
+        return generate_html(tid, block.data or tools_map[tid]).encode('utf-8')
+
+    # One pass over the scanner's byte offsets: copy the text between blocks, convert each block in place
+    raw = content.encode('utf-8')
+    parts = []
+    last_end = 0
+    for block in legacy:
+        if block.start < last_end:
+            continue  # nested inside a block already replaced
+        html = convert_block(block)
+        if html is None:
+            continue
+        parts.append(raw[last_end:block.start])
+        parts.append(html)
+        last_end = block.end
+    parts.append(raw[last_end:])
+    return b''.join(parts).decode('utf-8')
+
+
+def main(post='errorpost.html', tools='found_tools_phase9.json'):
+    tools_map = load_tools_map(tools)
+
+    with open(post, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    new_content = convert_post(content, tools_map)
+
+    with open(post, 'w', encoding='utf-8') as f:
+        f.write(new_content)
+
+    print("Conversion complete.")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,58 +1,744 @@
 import re
+import argparse
+import base64
 import binascii
+import hashlib
 import json
+import os
+import shutil
+import subprocess
+import sys
+import zlib
+from dataclasses import dataclass, asdict
 
 # JS Logic V5 (Uses data-var)
 # JS Logic V5.1 (Reactive Auto-Calc)
+# JS Logic V5.2 (Cached element maps, frame-batched recalculation)
+# JS Logic V5.3 (Single instance per page)
+# JS Logic V5.4 (Scoped delegation on calculator containers)
+# JS Logic V5.5 (Diffed textContent rendering)
+# JS Logic V5.6 (Per-calculator memoization)
+# JS Logic V5.7 (Optional Web Worker execution)
+# JS Logic V5.8 (Typed, clamped input coercion)
+# JS Logic V5.9 (Declarative output formatting, cached Intl formatters)
+# JS Logic V6.0 (Split formulas, dependency-aware recomputation)
+# JS Logic V6.1 (Shared variables across calculators)
+# JS Logic V6.2 (Boot only calculators whose formula has been shipped)
+# JS Logic V6.3 (Ungrouped plain numbers, en-US formatting unless the page sets lang)
+# JS Logic V6.4 (Ungrouped currency and percent too)
+# JS Logic V6.5 (Clamped inputs are marked aria-invalid)
+# JS Logic V6.6 (Class changes no longer invalidate element maps)
 js_logic = r"""
-window.ozExecuteCalc = function(target) {
-    // Handle both Button and Container triggers
-    var container = target.hasAttribute('data-itb-calculator') ? target : target.closest('[data-itb-calculator]');
-    if (!container) return;
-
-    var id = container.getAttribute('data-itb-calculator');
-    var func = window.OZ_FORMULAS[id];
-    if (!func) return console.error('No formula for ' + id);
-
-    var inputs = container.querySelectorAll('[data-var]');
-    var values = {};
-    inputs.forEach(function(inp) {
-        var key = inp.getAttribute('data-var');
-        var val = inp.value;
-        if (inp.tagName === 'SELECT') {
-            values[key] = val;
+(function() {
+    // Single instance: archive pages carry one payload per post. The first engine installs
+    // listeners; later payloads only merge their formulas (below) and boot their calculators.
+    var VERSION = 6.6;
+    var existing = window.OZ_ENGINE;
+    if (existing && existing.version >= VERSION) return;
+    if (existing && existing.teardown) existing.teardown();
+
+    var engine = window.OZ_ENGINE = { version: VERSION, teardown: null };
+
+    // Lazy builds (--lazy) ship each formula as its own hex slice of a #oz-safe-chunks-* store.
+    // OZ_CHUNKS maps id -> [offset, length, store id]; a slice is decoded and evaluated on first use.
+    window.ozDecodeHex = function(v) {
+        var n = v.length >> 1, bytes = new Uint8Array(n), c, k;
+        for (var i = 0, j = 0; i < n; i++, j += 2) {
+            c = v.charCodeAt(j);
+            k = v.charCodeAt(j + 1);
+            bytes[i] = ((c & 15) + (c >> 6) * 9) << 4 | ((k & 15) + (k >> 6) * 9);
+        }
+        return new TextDecoder().decode(bytes);
+    };
+
+    window.ozFormula = function(id) {
+        var func = window.OZ_FORMULAS[id];
+        if (func) return func;
+        var slot = window.OZ_CHUNKS && window.OZ_CHUNKS[id];
+        var store = slot && document.getElementById(slot[2] || 'oz-safe-chunks');
+        if (!store) return null;
+        try {
+            func = window.eval('(' + window.ozDecodeHex(store.value.substr(slot[0], slot[1])) + ')');
+        } catch(e) {
+            return console.error('OZ: formula chunk ' + id + ' failed', e);
+        }
+        return (window.OZ_FORMULAS[id] = func);
+    };
+
+    window.ozIsHydrated = function(id) {
+        return !!window.OZ_FORMULAS[id] || !(window.OZ_CHUNKS && window.OZ_CHUNKS[id]);
+    };
+
+    // Per-container element maps: built on first use, dropped when the container's DOM changes
+    var maps = new WeakMap();
+
+    // Typed coercion, compiled once per field from its markup: selects and text-like inputs stay
+    // strings; number/range inputs (and untyped legacy inputs) become numbers, clamped to min/max.
+    function coercer(inp) {
+        var type = inp.tagName === 'SELECT' ? 'select' : (inp.getAttribute('type') || '').toLowerCase();
+        var field = { el: inp, key: inp.getAttribute('data-var'), number: !type || type === 'number' || type === 'range' };
+        var shared = inp.getAttribute('data-itb-shared');
+        if (shared !== null) field.shared = shared || field.key;
+        if (field.number) {
+            var min = parseFloat(inp.getAttribute('min'));
+            var max = parseFloat(inp.getAttribute('max'));
+            field.min = isNaN(min) ? -Infinity : min;
+            field.max = isNaN(max) ? Infinity : max;
+        }
+        return field;
+    }
+
+    function coerce(map) {
+        var values = map.values, inputs = map.inputs, field, val, clamped;
+        for (var i = 0; i < inputs.length; i++) {
+            field = inputs[i];
+            val = field.el.value;
+            if (field.number) {
+                clamped = val !== '';
+                val = parseFloat(val) || 0;
+                if (val < field.min) val = field.min;
+                else if (val > field.max) val = field.max;
+                else clamped = false;
+                if (clamped || field.clamped) markClamped(field, clamped, val);
+            }
+            values[field.key] = val;
+        }
+        return values;
+    }
+
+    // The formula runs on the bound, not on what was typed: say so on the field instead of
+    // rewriting it under the reader's cursor (aria-invalid, styled by the loader, and a title)
+    function markClamped(field, clamped, val) {
+        if (clamped === field.clamped && (!clamped || field.bound === val)) return;
+        field.clamped = clamped;
+        field.bound = val;
+        if (clamped) {
+            field.el.setAttribute('aria-invalid', 'true');
+            field.el.setAttribute('title', 'Out of range: using ' + val);
         } else {
-            values[key] = parseFloat(val) || 0;
+            field.el.removeAttribute('aria-invalid');
+            field.el.removeAttribute('title');
+        }
+    }
+
+    function ozMap(container) {
+        var map = maps.get(container);
+        if (map) return map;
+
+        map = { inputs: [], keys: [], values: {}, outputs: {}, formats: {}, deps: {}, publish: {}, outContainer: container.querySelector('.itb-outputs') };
+        container.querySelectorAll('[data-var]').forEach(function(inp) {
+            map.inputs.push(coercer(inp));
+            var key = inp.getAttribute('data-var');
+            if (map.keys.indexOf(key) < 0) map.keys.push(key);
+        });
+        if (map.outContainer) {
+            var locale = (container.closest('[lang]') || document.documentElement).getAttribute('lang') || '';
+            map.outContainer.querySelectorAll('[data-itb-output]').forEach(function(el) {
+                var key = el.getAttribute('data-itb-output');
+                if (map.outputs[key]) return;
+                map.outputs[key] = el;
+                map.formats[key] = outputFormat(el, locale);
+                var deps = el.getAttribute('data-itb-deps');
+                if (deps) map.deps[key] = deps.split(/[\s,]+/).filter(Boolean);
+                var published = el.getAttribute('data-itb-publish');
+                if (published !== null) map.publish[key] = published || key;
+            });
         }
-    });
 
-    try {
-        var result = func(values);
-        var outContainer = container.querySelector('.itb-outputs');
-        if (!outContainer) return;
+        // Only attributes the map is built from; class toggles (hover, validation styling) keep it
+        map.observer = new MutationObserver(function(records) {
+            for (var i = 0; i < records.length; i++) {
+                // Our own output writes don't change the structure
+                if (records[i].type === 'childList' && records[i].target.closest('[data-itb-output]')) continue;
+                maps.delete(container);
+                map.observer.disconnect();
+                bus = null;
+                return;
+            }
+        });
+        map.observer.observe(container, { childList: true, subtree: true, attributes: true, attributeFilter: ['data-var', 'data-itb-output', 'type', 'min', 'max', 'data-itb-format', 'data-itb-unit', 'data-itb-precision', 'data-itb-deps', 'data-itb-shared', 'data-itb-publish', 'lang'] });
+        maps.set(container, map);
+        return map;
+    }
+
+    // Rendering: remember the last text per output element and only queue a write when it changes.
+    // Writes use textContent (no layout read) and are committed together, once per frame/boot slice.
+    var rendered = new WeakMap();
+    var shown = new WeakSet();
+    var writes = [];
+    var batching = false;
+    var renderStats = window.OZ_RENDER_STATS = { writes: 0, skipped: 0, calculators: {} };
+
+    // Output formatting is declared on the output element and resolved once per element map:
+    //   data-itb-format="currency|percent|number"  data-itb-precision="1"  data-itb-unit="ml/h"
+    // Numbers go through Intl.NumberFormat instances shared per locale/format/precision. Strings a
+    // formula already formatted are shown as they are (currency/percent still parse numeric strings).
+    // Nothing is grouped (1016 ml, $1234.50, as toFixed printed them), and pages without a lang
+    // format as en-US whatever the reader's browser locale; a lang attribute opts into its locale.
+    var formatters = {};
+
+    function numberFormat(locale, fmt, precision) {
+        var cacheKey = locale + '|' + fmt + '|' + precision;
+        if (cacheKey in formatters) return formatters[cacheKey];
+
+        var opts = { useGrouping: false };
+        if (fmt === 'currency') {
+            opts.style = 'currency';
+            opts.currency = 'USD';
+        } else if (fmt === 'percent') {
+            opts.style = 'percent';
+        }
+        if (precision >= 0) opts.minimumFractionDigits = opts.maximumFractionDigits = precision;
+        try {
+            return (formatters[cacheKey] = new Intl.NumberFormat(locale || 'en-US', opts));
+        } catch(e) {
+            return (formatters[cacheKey] = null);
+        }
+    }
+
+    function outputFormat(el, locale) {
+        var fmt = el.getAttribute('data-itb-format') || '';
+        var precision = parseInt(el.getAttribute('data-itb-precision'), 10);
+        if (isNaN(precision)) precision = fmt === 'currency' ? 2 : (fmt === 'percent' ? 1 : -1);
+        var unit = el.getAttribute('data-itb-unit') || '';
+        // Tool definitions use an em dash for "no unit"
+        if (unit === '\u2014' || unit === '-') unit = '';
+        else if (unit && unit.charAt(0) !== '/') unit = ' ' + unit;
+
+        // Undeclared outputs keep the formula's own number formatting
+        var nf = fmt || precision >= 0 ? numberFormat(locale, fmt, precision) : null;
+        return { fmt: fmt, precision: precision, unit: unit, nf: nf };
+    }
+
+    function formatOutput(spec, val) {
+        var num = val;
+        if (typeof val !== 'number') {
+            if (spec.fmt !== 'currency' && spec.fmt !== 'percent') return String(val);
+            num = parseFloat(val);
+            if (isNaN(num)) return String(val);
+        }
+        if (spec.fmt === 'percent') num /= 100; // formulas return percent units
+        if (spec.nf) return spec.nf.format(num) + spec.unit;
+
+        // No Intl (or a bad locale): the engine's historic formats
+        if (spec.fmt === 'currency') return '$' + num.toFixed(spec.precision) + spec.unit;
+        if (spec.fmt === 'percent') return (num * 100).toFixed(spec.precision) + '%' + spec.unit;
+        return (spec.precision >= 0 ? num.toFixed(spec.precision) : String(num)) + spec.unit;
+    }
+
+    function render(id, map, result) {
+        var stats = renderStats.calculators[id] || (renderStats.calculators[id] = { writes: 0, skipped: 0 });
 
         // Mapping Mode
         for (var key in result) {
-            var el = outContainer.querySelector('[data-itb-output="' + key + '"]');
-            if (el) {
-                var val = result[key];
-                var fmt = el.getAttribute('data-itb-format');
-                
-                if (fmt === 'currency') {
-                    if (!isNaN(parseFloat(val))) val = '$' + parseFloat(val).toFixed(2);
-                } else if (fmt === 'percent') {
-                    if (!isNaN(parseFloat(val))) val = parseFloat(val).toFixed(1) + '%';
+            var el = map.outputs[key];
+            if (!el) continue;
+            var text = formatOutput(map.formats[key], result[key]);
+            if (rendered.get(el) === text) {
+                renderStats.skipped++;
+                stats.skipped++;
+                continue;
+            }
+            rendered.set(el, text);
+            writes.push(el, text);
+            stats.writes++;
+        }
+        if (!shown.has(map.outContainer)) {
+            shown.add(map.outContainer);
+            writes.push(map.outContainer, null);
+        }
+        if (!batching) commitWrites();
+    }
+
+    function commitWrites() {
+        for (var i = 0; i < writes.length; i += 2) {
+            if (writes[i + 1] === null) writes[i].style.display = 'block';
+            else writes[i].textContent = writes[i + 1];
+            renderStats.writes++;
+        }
+        writes.length = 0;
+    }
+
+    function batchWrites(fn) {
+        batching = true;
+        try {
+            fn();
+        } finally {
+            batching = false;
+            commitWrites();
+        }
+    }
+
+    // Memoization: a small LRU of results per calculator, keyed by the normalized input tuple.
+    // Formulas that aren't pure functions of their inputs opt out via OZ_FORMULA_META[id].pure = false.
+    var MEMO_SIZE = 16;
+    var memos = {};
+    var memoStats = window.OZ_MEMO_STATS = { hits: 0, misses: 0, calculators: {} };
+
+    function memoFor(id, func) {
+        var meta = window.OZ_FORMULA_META && window.OZ_FORMULA_META[id];
+        // Split formulas are incremental already (see runSplit)
+        if ((meta && meta.pure === false) || typeof func !== 'function') return null;
+
+        var memo = memos[id];
+        if (!memo || memo.func !== func) {
+            var stats = memoStats.calculators[id] || (memoStats.calculators[id] = { hits: 0, misses: 0 });
+            memo = memos[id] = { func: func, results: new Map(), stats: stats };
+        }
+        return memo;
+    }
+
+    function memoGet(memo, tuple) {
+        var result = memo.results.get(tuple);
+        if (result === undefined) {
+            memoStats.misses++;
+            memo.stats.misses++;
+            return result;
+        }
+        // Re-insert so Map iteration order stays least-recently-used first
+        memo.results.delete(tuple);
+        memo.results.set(tuple, result);
+        memoStats.hits++;
+        memo.stats.hits++;
+        return result;
+    }
+
+    function memoSet(memo, tuple, result) {
+        memo.results.set(tuple, result);
+        if (memo.results.size > MEMO_SIZE) memo.results.delete(memo.results.keys().next().value);
+    }
+
+    // Worker execution: formulas flagged OZ_FORMULA_META[id].worker = true run in one shared Blob-URL
+    // worker. Every execution takes a new sequence number per container, so a late worker answer
+    // never overwrites a newer result. If the site's CSP refuses the worker, flagged formulas
+    // quietly run on the main thread like everything else.
+    var WORKER_SRC = 'var f={};onmessage=function(e){var d=e.data,r;try{if(d.src)f[d.id]=(0,eval)("("+d.src+")");' +
+        'r={seq:d.seq,result:f[d.id](d.values)}}catch(x){r={seq:d.seq,error:String(x)}}postMessage(r)}';
+    var worker = null;
+    var workerFailed = false;
+    var workerFuncs = {};
+    var pending = {};
+    var latest = new WeakMap();
+    var seq = 0;
+
+    function getWorker() {
+        if (worker || workerFailed) return worker;
+        try {
+            worker = new Worker(URL.createObjectURL(new Blob([WORKER_SRC], { type: 'text/javascript' })));
+            worker.onmessage = onWorkerMessage;
+            worker.onerror = onWorkerError;
+        } catch(e) {
+            workerFailed = true;
+            worker = null;
+        }
+        return worker;
+    }
+
+    function runInWorker(id, func, job) {
+        var meta = window.OZ_FORMULA_META && window.OZ_FORMULA_META[id];
+        if (!meta || !meta.worker || !getWorker()) return false;
+
+        var msg = { seq: job.seq, id: id, values: job.values };
+        if (workerFuncs[id] !== func) {
+            workerFuncs[id] = func;
+            msg.src = func.toString();
+        }
+        pending[job.seq] = job;
+        worker.postMessage(msg);
+        return true;
+    }
+
+    function onWorkerMessage(e) {
+        var job = pending[e.data.seq];
+        if (!job) return;
+        delete pending[e.data.seq];
+        // Stale: the container has been recalculated since this request went out
+        if (latest.get(job.container) !== job.seq) return;
+        if (e.data.error) return console.error(e.data.error);
+
+        if (job.memo) memoSet(job.memo, job.tuple, e.data.result);
+        var map = ozMap(job.container);
+        publish(map, e.data.result);
+        if (map.outContainer) render(job.id, map, e.data.result);
+    }
+
+    function onWorkerError(e) {
+        // Blocked by CSP or failed to start: finish the waiting jobs on the main thread
+        if (e && e.preventDefault) e.preventDefault();
+        workerFailed = true;
+        worker.terminate();
+        worker = null;
+        var waiting = pending;
+        pending = {};
+        for (var s in waiting) window.ozScheduleCalc(waiting[s].container);
+    }
+
+    // Split formulas: { output: function(v, r) {...}, ... } compute one output each, in order, and
+    // see earlier outputs of the same run on r. An output is recomputed only when one of its
+    // dependencies changed since the container's last run: the keys in its data-itb-deps attribute,
+    // or else the v.key / r.key reads found in its source. Any other use of v or r means "always".
+    var depCache = new WeakMap();
+
+    function inferDeps(fn) {
+        if (depCache.has(fn)) return depCache.get(fn);
+        var src = fn.toString();
+        var close = src.indexOf(')');
+        var params = src.slice(src.indexOf('(') + 1, close).split(',');
+        var body = src.slice(close + 1);
+        var deps = [];
+
+        for (var i = 0; i < params.length && deps; i++) {
+            var name = params[i].trim().replace(/\$/g, '\\$');
+            if (!name) continue;
+            var reads = body.match(new RegExp('(^|[^\\w$.])' + name + '(?![\\w$])(\\.[A-Za-z_$][\\w$]*)?', 'g')) || [];
+            for (var j = 0; j < reads.length; j++) {
+                var dot = reads[j].indexOf('.', 1);
+                if (dot < 0) {
+                    deps = null;
+                    break;
                 }
+                deps.push(reads[j].slice(dot + 1));
+            }
+        }
+        depCache.set(fn, deps);
+        return deps;
+    }
+
+    function runSplit(map, parts, values) {
+        var first = map.parts !== parts;
+        if (first) {
+            map.parts = parts;
+            map.last = {};
+            map.results = {};
+        }
 
-                el.innerText = val;
+        var changed = {}, key, i;
+        for (i = 0; i < map.keys.length; i++) {
+            key = map.keys[i];
+            if (first || map.last[key] !== values[key]) {
+                changed[key] = true;
+                map.last[key] = values[key];
             }
         }
-        outContainer.style.display = 'block';
-    } catch(e) {
-        console.error(e);
+
+        var results = map.results, out = {};
+        for (key in parts) {
+            var deps = map.deps[key] || inferDeps(parts[key]);
+            var dirty = first || !deps;
+            for (i = 0; !dirty && i < deps.length; i++) dirty = changed[deps[i]] === true;
+            if (!dirty) continue;
+
+            var val = parts[key](values, results);
+            if (val !== results[key]) changed[key] = true;
+            out[key] = results[key] = val;
+        }
+        return out;
     }
-};
+
+    // #if METRICS
+    // Instrumented builds (--metrics) only: everything between these markers is stripped otherwise.
+    // The loader adds decode/eval times; phases are performance.measure entries named "oz:*".
+    var metrics = window.OZ_METRICS = window.OZ_METRICS || {};
+    metrics.engine = VERSION;
+    metrics.formulas = metrics.formulas || {};
+    metrics.render = renderStats;
+    metrics.memo = memoStats;
+
+    function measure(name) {
+        performance.mark(name + ':end');
+        performance.measure(name, name + ':start', name + ':end');
+        var entries = performance.getEntriesByName(name, 'measure');
+        return entries[entries.length - 1].duration;
+    }
+
+    // Per-call timing uses performance.now(): one mark per keystroke would flood the timeline
+    function timeFormula(id, started) {
+        var entry = metrics.formulas[id] || (metrics.formulas[id] = { calls: 0, ms: 0 });
+        entry.calls++;
+        entry.ms += performance.now() - started;
+    }
+
+    // #endif
+    window.ozExecuteCalc = function(target) {
+        // Handle both Button and Container triggers
+        var container = target.hasAttribute('data-itb-calculator') ? target : target.closest('[data-itb-calculator]');
+        if (!container) return;
+
+        var id = container.getAttribute('data-itb-calculator');
+        var func = window.ozFormula(id);
+        if (!func) return console.error('No formula for ' + id);
+
+        var map = ozMap(container);
+        // One values object per container, refilled on every run
+        var values = coerce(map);
+
+        var job = { seq: ++seq, id: id, container: container, values: values, memo: memoFor(id, func) };
+        latest.set(container, job.seq);
+        if (job.memo) job.tuple = map.keys.map(function(key) { return key + '=' + values[key]; }).join('\u0001');
+
+        try {
+            var result = job.memo ? memoGet(job.memo, job.tuple) : undefined;
+            if (result === undefined) {
+                // #if METRICS
+                var started = performance.now();
+                // #endif
+                if (typeof func !== 'function') result = runSplit(map, func, values);
+                else if (runInWorker(id, func, job)) return;
+                else result = func(values);
+                // #if METRICS
+                timeFormula(id, started);
+                // #endif
+                if (job.memo) memoSet(job.memo, job.tuple, result);
+            }
+            publish(map, result);
+            if (!map.outContainer) return;
+            render(id, map, result);
+        } catch(e) {
+            console.error(e);
+        }
+    };
+
+    // Bursts of input events collapse into one recompute per container per animation frame
+    var queue = new Set();
+    var nextFrame = window.requestAnimationFrame ? window.requestAnimationFrame.bind(window) : function(f) { return setTimeout(f, 16); };
+
+    var flushing = null;
+
+    // Containers scheduled while flushing (shared-variable propagation) run in the same frame,
+    // producers before consumers; each container runs at most once per frame.
+    function flush() {
+        flushing = new Set();
+        batchWrites(function() {
+            while (queue.size) {
+                var next = null;
+                queue.forEach(function(c) {
+                    if (!next || (bus && (bus.rank.get(c) || 0) < (bus.rank.get(next) || 0))) next = c;
+                });
+                queue.delete(next);
+                flushing.add(next);
+                window.ozExecuteCalc(next);
+            }
+        });
+        flushing = null;
+    }
+
+    window.ozScheduleCalc = function(container) {
+        if (queue.has(container)) return;
+        if (flushing) {
+            if (!flushing.has(container)) queue.add(container);
+            return;
+        }
+        queue.add(container);
+        if (queue.size === 1) nextFrame(flush);
+    };
+
+    // Shared variables: a data-var field marked data-itb-shared="name" (default: its data-var) is
+    // kept in sync with every other field sharing that name on the page, and an output marked
+    // data-itb-publish="name" feeds its raw result into those fields. Only the calculators that
+    // consume a changed name are recomputed. The producer -> consumer graph is ranked once
+    // (topologically) so propagation runs in dependency order; calculators on a cycle are
+    // reported and never re-run within the frame that changed them.
+    var bus = null;
+
+    function busIndex() {
+        if (bus) return bus;
+        bus = { fields: {}, rank: new Map() };
+        var consumers = {}, producers = {}, nodes = [];
+        managed.forEach(function(c) {
+            if (!c.querySelector('[data-itb-shared],[data-itb-publish]')) return;
+            var map = ozMap(c);
+            nodes.push(c);
+            map.inputs.forEach(function(field) {
+                if (!field.shared) return;
+                (bus.fields[field.shared] || (bus.fields[field.shared] = [])).push({ el: field.el, container: c });
+                (consumers[field.shared] || (consumers[field.shared] = [])).push(c);
+            });
+            for (var key in map.publish) (producers[map.publish[key]] || (producers[map.publish[key]] = [])).push(c);
+        });
+
+        // Kahn's algorithm over producer -> consumer edges
+        var edges = new Map(), indegree = new Map();
+        nodes.forEach(function(c) { edges.set(c, []); indegree.set(c, 0); });
+        for (var name in producers) {
+            (consumers[name] || []).forEach(function(to) {
+                producers[name].forEach(function(from) {
+                    edges.get(from).push(to);
+                    indegree.set(to, indegree.get(to) + 1);
+                });
+            });
+        }
+        var ready = nodes.filter(function(c) { return !indegree.get(c); });
+        for (var rank = 0; rank < ready.length; rank++) {
+            bus.rank.set(ready[rank], rank);
+            edges.get(ready[rank]).forEach(function(to) {
+                indegree.set(to, indegree.get(to) - 1);
+                if (!indegree.get(to)) ready.push(to);
+            });
+        }
+        var cyclic = nodes.filter(function(c) { return !bus.rank.has(c); });
+        if (cyclic.length) {
+            console.warn('OZ: shared variable cycle between ' + cyclic.map(function(c) { return c.getAttribute('data-itb-calculator'); }).join(', '));
+            cyclic.forEach(function(c) { bus.rank.set(c, nodes.length); });
+        }
+        return bus;
+    }
+
+    function share(name, value, source) {
+        var fields = busIndex().fields[name];
+        if (!fields) return;
+        var text = String(value);
+        for (var i = 0; i < fields.length; i++) {
+            var field = fields[i];
+            if (field.el === source || field.el.value === text) continue;
+            field.el.value = text;
+            window.ozScheduleCalc(field.container);
+        }
+    }
+
+    function publish(map, result) {
+        for (var key in map.publish) {
+            if (key in result) share(map.publish[key], result[key], null);
+        }
+    }
+
+    // Scoped delegation: listeners live on the calculator containers this engine manages, and
+    // only data-var fields get past the first line, so comment forms, search boxes and other
+    // plugins' inputs cost nothing.
+    var managed = new Set();
+
+    // Listen for Input Changes (Text/Number) and Change Events (Select/Radio/Checkbox) - Rule 13
+    function onEdit(e) {
+        if (!e.target.hasAttribute || !e.target.hasAttribute('data-var')) return;
+        window.ozScheduleCalc(e.currentTarget);
+        if (e.target.hasAttribute('data-itb-shared')) {
+            share(e.target.getAttribute('data-itb-shared') || e.target.getAttribute('data-var'), e.target.value, e.target);
+        }
+    }
+
+    // Lazy builds: hydrate a calculator's formula when it first gets focus
+    function onFocus(e) {
+        if (!e.target.hasAttribute || !e.target.hasAttribute('data-var')) return;
+        if (!window.ozIsHydrated(e.currentTarget.getAttribute('data-itb-calculator'))) window.ozScheduleCalc(e.currentTarget);
+    }
+
+    function bind(container) {
+        if (managed.has(container)) return;
+        managed.add(container);
+        bus = null;
+        container.addEventListener('input', onEdit);
+        container.addEventListener('change', onEdit);
+        container.addEventListener('focusin', onFocus);
+    }
+
+    function unbind(container) {
+        if (!managed.delete(container)) return;
+        bus = null;
+        container.removeEventListener('input', onEdit);
+        container.removeEventListener('change', onEdit);
+        container.removeEventListener('focusin', onFocus);
+        var map = maps.get(container);
+        if (map) map.observer.disconnect();
+        maps.delete(container);
+        queue.delete(container);
+        booted.delete(container);
+    }
+
+    // Containers removed from the page (AJAX navigation, load-more rewrites) are unbound
+    var removals = new MutationObserver(function(records) {
+        for (var i = 0; i < records.length; i++) {
+            var nodes = records[i].removedNodes;
+            for (var j = 0; j < nodes.length; j++) {
+                if (nodes[j].nodeType !== 1) continue;
+                managed.forEach(function(c) { if (!c.isConnected) unbind(c); });
+                return;
+            }
+        }
+    });
+    removals.observe(document.body || document.documentElement, { childList: true, subtree: true });
+
+    // Initial boot: visible calculators first, in time slices that yield to the browser in between.
+    // Ordering reads every rect once up front (no IntersectionObserver: the theme hooks it, Rule 5).
+    var BOOT_SLICE_MS = 8;
+
+    var yieldToBrowser = (function() {
+        if (typeof MessageChannel === 'undefined') return function(f) { setTimeout(f, 0); };
+        var channel = new MessageChannel(), jobs = [];
+        channel.port1.onmessage = function() { jobs.shift()(); };
+        return function(f) {
+            jobs.push(f);
+            channel.port2.postMessage(0);
+        };
+    })();
+
+    // Containers already booted by an earlier payload on the same page
+    var booted = new WeakSet();
+
+    window.ozBoot = function() {
+        var started = performance.now();
+        // #if METRICS
+        performance.mark('oz:boot:start');
+        // #endif
+        var active = document.activeElement && document.activeElement.closest && document.activeElement.closest('[data-itb-calculator]');
+        var viewHeight = window.innerHeight || document.documentElement.clientHeight;
+        var calcs = Array.prototype.filter.call(document.querySelectorAll('[data-itb-calculator]'), function(c) {
+            bind(c);
+            return !booted.has(c);
+        });
+
+        var order = calcs.map(function(c, i) {
+            var rect = c.getBoundingClientRect();
+            var distance = rect.bottom < 0 ? -rect.bottom : (rect.top > viewHeight ? rect.top - viewHeight : 0);
+            return { el: c, distance: c === active ? -1 : distance, index: i };
+        }).sort(function(a, b) {
+            return a.distance - b.distance || a.index - b.index;
+        });
+
+        return new Promise(function(resolve) {
+            var next = 0, slices = 0, count = 0;
+            function slice() {
+                var sliceStart = performance.now();
+                var more = false;
+                slices++;
+                batchWrites(function() {
+                    while (next < order.length) {
+                        var c = order[next++].el, id = c.getAttribute('data-itb-calculator');
+                        // Calculators whose formula no payload has shipped yet (other tree-shaken posts
+                        // on an archive page) stay unbooted: the payload that ships it boots them.
+                        // Lazy formulas wait for their first interaction, unless already focused.
+                        var shipped = window.OZ_FORMULAS[id] || (window.OZ_CHUNKS && window.OZ_CHUNKS[id]);
+                        if (shipped && (c === active || window.ozIsHydrated(id))) {
+                            booted.add(c);
+                            count++;
+                            window.ozExecuteCalc(c);
+                        }
+                        if (next < order.length && performance.now() - sliceStart > BOOT_SLICE_MS) return (more = true);
+                    }
+                });
+                if (more) return yieldToBrowser(slice);
+                var detail = { calculators: count, slices: slices, ms: performance.now() - started };
+                // #if METRICS
+                metrics.boot = (metrics.boot || 0) + measure('oz:boot');
+                // #endif
+                document.dispatchEvent(new CustomEvent('oz:ready', { detail: detail }));
+                resolve(detail);
+            }
+            slice();
+        });
+    };
+
+    // A newer engine version arriving later unbinds this one before installing itself
+    engine.teardown = function() {
+        removals.disconnect();
+        managed.forEach(unbind);
+        if (worker) worker.terminate();
+    };
+})();
+
 window.OZ_FORMULAS = window.OZ_FORMULAS || {};
+// Per-formula flags:
+//   "my-calculator": { pure: false }  reads the clock or other state besides its inputs; never cached
+//   "my-calculator": { worker: true } heavy; runs in a Web Worker (must not touch window/document)
+window.OZ_FORMULA_META = window.OZ_FORMULA_META || {};
 Object.assign(window.OZ_FORMULAS, {
     // Phase 10: Active Make-Up Consumption
     "makeup-consumption-calculator-active-1": function(v) {
@@ -580,27 +1266,33 @@ Object.assign(window.OZ_FORMULAS, {
     // --- PHASE 5: NOZZLE CLOGGING TOOLS (8) ---
 
     // 1. Make-Up Planner
-    "itb-makeup-planner-v4": function(v) {
-        var t = parseFloat(v.tempC);
-        var h = parseFloat(v.hours);
-        var n = v.nozzle;
-        var d = parseFloat(v.duty);
-        var p = parseFloat(v.price || 18);
-        
-        // Base consumption factor k (ml/h) estimation
-        var k = 6;
-        if (n === "60") k = 8;
-        if (n === "75") k = 10;
-        
-        // Temp factor: +5% per deg > 20
-        var tFactor = 1 + 0.05 * (t - 20);
-        // Duty factor: 0.5 static + 0.5 * duty (evaporation vs usage)
-        var dFactor = 0.5 + 0.5 * (d / 100);
-        
-        var ml = k * h * tFactor * dFactor;
-        var cost = (ml / 1000) * p;
-        
-        return { mu_est: ml.toFixed(0) + " ml", budget: "$" + cost.toFixed(2) };
+    // Split formula: each output reruns only when its own inputs change (price edits skip mu_est)
+    "itb-makeup-planner-v4": {
+        mu_est: function(v) {
+            var t = parseFloat(v.tempC);
+            var h = parseFloat(v.hours);
+            var n = v.nozzle;
+            var d = parseFloat(v.duty);
+            
+            // Base consumption factor k (ml/h) estimation
+            var k = 6;
+            if (n === "60") k = 8;
+            if (n === "75") k = 10;
+            
+            // Temp factor: +5% per deg > 20
+            var tFactor = 1 + 0.05 * (t - 20);
+            // Duty factor: 0.5 static + 0.5 * duty (evaporation vs usage)
+            var dFactor = 0.5 + 0.5 * (d / 100);
+            
+            // Formatted by the output's data-itb-unit/precision
+            return k * h * tFactor * dFactor;
+        },
+
+        budget: function(v, r) {
+            var p = parseFloat(v.price || 18);
+            // data-itb-format="currency"
+            return (r.mu_est / 1000) * p;
+        }
     },
 
     // 2. Humidity Static
@@ -1437,81 +2129,785 @@ Object.assign(window.OZ_FORMULAS, {
 
 });
 
-// --- v13 Engine (Reactive) ---
-// Listen for Input Changes (Auto-Calc)
-// Listen for Input Changes (Text/Number)
-document.addEventListener('input', function(e) {
-    var container = e.target.closest('[data-itb-calculator]');
-    if (container) {
-        window.ozExecuteCalc(container);
-    }
-});
-
-// Listen for Change Events (Select/Radio/Checkbox) - CRITICAL FIX
-document.addEventListener('change', function(e) {
-    var container = e.target.closest('[data-itb-calculator]');
-    if (container) {
-        window.ozExecuteCalc(container);
-    }
+// Initial boot (resolves with { calculators, slices, ms }; also fires "oz:ready" on document)
+window.OZ_READY = window.ozBoot();
+window.OZ_READY.then(function(boot) {
+    console.log('OZ: v' + window.OZ_ENGINE.version + ' Reactive Engine Fully Loaded (' + boot.calculators + ' calculators, ' + boot.ms.toFixed(1) + ' ms)');
 });
-
-// Initial boot
-var calcs = document.querySelectorAll('[data-itb-calculator]');
-calcs.forEach(function(c) { window.ozExecuteCalc(c); });
-
-console.log('OZ: v5.1 Reactive Engine Fully Loaded');
 """
 
-# Check for Smart Quotes
-if "’" in js_logic or "“" in js_logic or "”" in js_logic:
-    print("FATAL ERROR: Smart quotes detected in JS logic!")
-    exit()
-
-# Hex Encode
-hex_payload = binascii.hexlify(js_logic.encode('utf-8')).decode('utf-8')
+# --- Tree Shaking ---
+# The formulas live in one Object.assign block (Rule 14). To ship only the
+# calculators a post uses, we walk that block with a small JS tokenizer so
+# braces inside strings, comments and regex literals don't confuse us.
+FORMULAS_ANCHOR = re.compile(r"Object\.assign\(\s*window\.OZ_FORMULAS\s*,\s*\{")
+
+JS_TOKEN = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<string>"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*')
+  | (?P<template>`(?:[^`\\]|\\.)*`)
+  | (?P<name>[A-Za-z_$][\w$]*)
+  | (?P<number>0[xX][0-9a-fA-F]+|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<punct>>>>=?|\.\.\.|===|!==|\*\*=?|<<=?|>>=?|&&|\|\||\?\?|\+\+|--|=>|[-+*/%&|^!=<>]=?|[{}()\[\];,.?:~])
+""", re.S | re.X)
+
+JS_REGEX_LITERAL = re.compile(r"/(?:[^/\\\n\[]|\\.|\[(?:[^\]\\\n]|\\.)*\])+/[a-z]*")
+
+# After these tokens a "/" starts a regex literal, not a division
+JS_REGEX_PREFIX_WORDS = {'return', 'typeof', 'case', 'do', 'else', 'in', 'instanceof', 'new', 'delete', 'void', 'throw'}
+
+
+def tokenize_js(src, pos=0):
+    """Yield (kind, text, start) tokens of src, including whitespace and comments."""
+    prev = None  # last significant token, decides regex vs division
+    while pos < len(src):
+        regex_ok = (prev is None
+                    or (prev[0] == 'punct' and prev[1] not in (')', ']', '}'))
+                    or (prev[0] == 'name' and prev[1] in JS_REGEX_PREFIX_WORDS))
+        m = None
+        if regex_ok and src.startswith('/', pos) and not src.startswith(('//', '/*'), pos):
+            m = JS_REGEX_LITERAL.match(src, pos)
+            kind = 'regex'
+        if m is None:
+            m = JS_TOKEN.match(src, pos)
+            if m is None:
+                raise ValueError(f"Unexpected character {src[pos]!r} at offset {pos}")
+            kind = m.lastgroup
+        text = m.group()
+        if kind not in ('ws', 'comment'):
+            prev = (kind, text)
+        yield kind, text, pos
+        pos = m.end()
+
+
+def split_formulas(js):
+    """Split js into (head, {formula_id: source}, tail) around the OZ_FORMULAS block."""
+    anchor = FORMULAS_ANCHOR.search(js)
+    if anchor is None:
+        raise ValueError("OZ_FORMULAS block not found")
+    open_brace = anchor.end() - 1
+
+    formulas = {}
+    depth = 0
+    expect = 'key'
+    key = value_start = last_end = None
+    for kind, text, start in tokenize_js(js, open_brace):
+        if kind in ('ws', 'comment'):
+            continue
+        if depth == 1 and expect == 'value':
+            value_start = start
+            expect = 'in_value'
+        if kind == 'punct' and text in ('(', '[', '{'):
+            depth += 1
+        elif kind == 'punct' and text in (')', ']', '}'):
+            depth -= 1
+            if depth == 0:
+                if expect == 'in_value':
+                    formulas[key] = js[value_start:last_end]
+                return js[:open_brace + 1], formulas, js[start:]
+        elif depth == 1:
+            if expect == 'key':
+                key = text.strip('"\'')
+                expect = 'colon'
+            elif expect == 'colon' and text == ':':
+                expect = 'value'
+            elif expect == 'in_value' and text == ',':
+                # Duplicate IDs: the later definition wins, as it does in JS
+                formulas[key] = js[value_start:last_end]
+                expect = 'key'
+        last_end = start + len(text)
+    raise ValueError("OZ_FORMULAS block is not closed")
+
+
+def join_formulas(head, formulas, tail):
+    body = ",\n\n".join(f"    {json.dumps(fid)}: {src}" for fid, src in formulas.items())
+    return f"{head}\n{body}\n{tail}"
+
+
+def find_calculator_ids(html):
+    """Calculator IDs used by a post, in document order."""
+    return list(dict.fromkeys(re.findall(r'data-itb-calculator="([^"]+)"', html)))
+
+
+# --- Minification ---
+# Runs on the tokenizer above, so string literals (the text formulas return)
+# are copied byte for byte. Newlines are only dropped where ASI can't apply.
+JS_RESTRICTED_WORDS = {'return', 'break', 'continue', 'throw'}
+JS_RESERVED_WORDS = {
+    'break', 'case', 'catch', 'class', 'const', 'continue', 'debugger', 'default', 'delete', 'do',
+    'else', 'enum', 'export', 'extends', 'false', 'finally', 'for', 'function', 'if', 'import', 'in',
+    'instanceof', 'let', 'new', 'null', 'return', 'super', 'switch', 'this', 'throw', 'true', 'try',
+    'typeof', 'var', 'void', 'while', 'with', 'yield', 'NaN', 'Infinity', 'undefined', 'arguments',
+}
+# Never renamed, even if some function declares them: they are also used as globals
+JS_KEEP_NAMES = {'window', 'document', 'console', 'navigator', 'performance', 'location', 'Math', 'JSON',
+                 'Object', 'Array', 'String', 'Number', 'Date', 'event', 'name', 'status', 'self', 'top',
+                 'parent', 'length', 'eval'}
+
+
+def _ends_expression(token):
+    kind, text = token
+    return kind in ('name', 'number', 'string', 'template', 'regex') or text in (')', ']', '}', '++', '--')
+
+
+def _starts_statement(token):
+    kind, text = token
+    return kind in ('name', 'number', 'string', 'template', 'regex') or text in ('{', '!', '~', '++', '--')
+
+
+def minify_js(src):
+    """Strip comments and redundant whitespace from src."""
+    out = []
+    prev = None
+    gap = None  # None: no whitespace since prev, '': whitespace, '\n': whitespace with a newline
+    for kind, text, _ in tokenize_js(src):
+        if kind in ('ws', 'comment'):
+            if gap != '\n':
+                gap = '\n' if '\n' in text else ''
+            continue
+        token = (kind, text)
+        if prev is not None and gap is not None:
+            if gap == '\n' and (prev[1] in JS_RESTRICTED_WORDS
+                                or (_ends_expression(prev) and _starts_statement(token))):
+                out.append('\n')
+            elif ((prev[1][-1].isalnum() or prev[1][-1] in '_$') and (text[0].isalnum() or text[0] in '_$')
+                  or (prev[0] == 'number' and text[0] == '.')
+                  or prev[1][-1] + text[0] in ('++', '--', '//', '/*')):
+                out.append(' ')
+        elif prev is not None and prev[1][-1] + text[0] in ('++', '--'):
+            out.append(' ')
+        out.append(text)
+        prev = token
+        gap = None
+    return ''.join(out)
+
+
+def _short_names():
+    letters = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    for n in letters:
+        yield n
+    for a in letters:
+        for b in letters + '0123456789':
+            yield a + b
+
+
+def _function_spans(tokens):
+    """(start, end) token index spans of outermost function expressions/declarations."""
+    spans = []
+    i = 0
+    while i < len(tokens):
+        if tokens[i] == ('name', 'function'):
+            depth = 0
+            j = i
+            while j < len(tokens):
+                text = tokens[j][1]
+                if tokens[j][0] == 'punct' and text == '{':
+                    depth += 1
+                elif tokens[j][0] == 'punct' and text == '}':
+                    depth -= 1
+                    if depth == 0:
+                        break
+                j += 1
+            spans.append((i, j))
+            i = j
+        i += 1
+    return spans
+
+
+def _declared_names(tokens):
+    """Names declared by var, function parameters, function names and catch clauses."""
+    names = set()
+    for i, (kind, text) in enumerate(tokens):
+        if (kind, text) == ('name', 'var'):
+            depth = 0
+            expect_name = True
+            for k2, t2 in tokens[i + 1:]:
+                if k2 == 'punct' and t2 in ('(', '[', '{'):
+                    depth += 1
+                elif k2 == 'punct' and t2 in (')', ']', '}'):
+                    if depth == 0:
+                        break
+                    depth -= 1
+                elif depth == 0 and t2 in (';', 'in', 'of'):
+                    break
+                elif depth == 0 and t2 == ',':
+                    expect_name = True
+                    continue
+                elif expect_name and k2 == 'name':
+                    names.add(t2)
+                expect_name = False
+        elif (kind, text) in (('name', 'function'), ('name', 'catch')):
+            j = i + 1
+            if text == 'function' and tokens[j][0] == 'name':
+                names.add(tokens[j][1])
+                j += 1
+            if tokens[j][1] != '(':
+                continue
+            for k2, t2 in tokens[j + 1:]:
+                if t2 == ')':
+                    break
+                if k2 == 'name':
+                    names.add(t2)
+    return names - JS_KEEP_NAMES - JS_RESERVED_WORDS
+
+
+def mangle_js(src):
+    """Shorten local identifiers inside every function of src.
+
+    Each outermost function is renamed as one unit: a name declared anywhere in
+    it is renamed everywhere in it, except after "." and as an object key.
+    Globals (top-level vars, window.*, formula IDs) are left alone.
+    """
+    tokens = [(kind, text) for kind, text, _ in tokenize_js(src) if kind not in ('ws', 'comment')]
+    out = list(tokens)
+    for first, last in _function_spans(tokens):
+        unit = tokens[first:last + 1]
+        declared = _declared_names(unit)
+        taken = {text for kind, text in unit if kind == 'name'} | JS_RESERVED_WORDS
+        counts = {}
+        for kind, text in unit:
+            if text in declared:
+                counts[text] = counts.get(text, 0) + 1
+        fresh = (n for n in _short_names() if n not in taken)
+        rename = {}
+        for name in sorted(counts, key=lambda n: (-counts[n], n)):
+            short = next(fresh)
+            if len(short) < len(name):
+                rename[name] = short
+        for i in range(first, last + 1):
+            kind, text = tokens[i]
+            if kind != 'name' or text not in rename:
+                continue
+            before = tokens[i - 1][1] if i > 0 else ''
+            after = tokens[i + 1][1] if i + 1 < len(tokens) else ''
+            if before == '.' or (after == ':' and before in ('{', ',')):
+                continue
+            out[i] = (kind, rename[text])
+    return minify_js(' '.join(text for _, text in out))
+
+
+# Build variants: "// #if FLAG" ... "// #endif" blocks in the JS are kept (minus the marker
+# lines) when FLAG is enabled and dropped otherwise. No nesting.
+JS_CONDITIONAL = re.compile(r"^[ \t]*// #if (\w+)[ \t]*\n(.*?)^[ \t]*// #endif[ \t]*\n", re.M | re.S)
+
+
+def preprocess_js(src, flags):
+    return JS_CONDITIONAL.sub(lambda m: m.group(2) if m.group(1) in flags else '', src)
+
+
+class BuildError(Exception):
+    """A build step failed. The CLI prints it as FATAL ERROR and leaves the post untouched."""
+
+
+def check_js(js):
+    """Raise BuildError for JS that would break once it is in a post."""
+    # Check for Smart Quotes
+    if "’" in js or "“" in js or "”" in js:
+        raise BuildError("Smart quotes detected in JS logic!")
+
+
+# Encode
+def encode_hex(js):
+    return binascii.hexlify(js.encode('utf-8')).decode('utf-8')
+
+
+def encode_deflate(js):
+    """zlib-deflate, then base64url without padding (A-Z a-z 0-9 - _ only: WordPress-safe)."""
+    packed = zlib.compress(js.encode('utf-8'), 9)
+    return base64.urlsafe_b64encode(packed).decode('ascii').rstrip('=')
+
+
+def payload_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+def encode_chunks(formulas):
+    """Hex-encode each formula on its own: (store id, concatenated hex, {id: [offset, length, store id]}).
+
+    The store id is content-derived, so several lazy payloads can share a page.
+    """
+    store_id = 'oz-safe-chunks-' + payload_hash(json.dumps(formulas))[:8]
+    parts, index, offset = [], {}, 0
+    for fid, src in formulas.items():
+        chunk = encode_hex(src)
+        index[fid] = [offset, len(chunk), store_id]
+        parts.append(chunk)
+        offset += len(chunk)
+    return store_id, ''.join(parts), index
+
+
+@dataclass
+class BuildOptions:
+    """Everything that shapes a build; the CLI flags map onto these one to one."""
+    tree_shake: bool = False
+    minify: bool = False
+    mangle: bool = False
+    lazy: bool = False
+    encoding: str = 'hex'
+    loader: str = 'v14'
+    boot: str = 'adaptive'
+    hex_fallback: bool = False
+    metrics: bool = False
+    local_cache: bool = False
+
+    @classmethod
+    def from_args(cls, args):
+        return cls(tree_shake=args.tree_shake, minify=args.minify, mangle=args.mangle, lazy=args.lazy,
+                   encoding=args.encoding, loader=args.loader, boot=args.boot,
+                   hex_fallback=args.hex_fallback, metrics=args.metrics, local_cache=args.local_cache)
+
+
+@dataclass
+class Payload:
+    js: str
+    hex: str
+    deflate: str
+    chunk_store: str = None
+    chunks: str = None
+
+    @property
+    def hash(self):
+        return payload_hash(self.js)
+
+
+# --- Build cache ---
+# Payloads are stored under a key made of the engine core, the sources of the formulas the
+# payload ships (the post's calculator set when tree shaking), the payload options and the
+# builder code itself. Posts that need the same formula subset share one encoded payload.
+# Posts get a small record too: its key adds the loader options and the post text outside the
+# loader block, and it holds the hash of the built post, so an unchanged post isn't rewritten.
+# Entries are files; a hit touches its mtime, and the oldest go once the directory passes max_bytes.
+BUILD_CACHE_DIR = '.oz-build-cache'
+BUILD_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+_builder_hash = None
+
+
+def builder_hash():
+    """Hash of this file minus the JS logic: changes when the pipeline or loader templates do."""
+    global _builder_hash
+    if _builder_hash is None:
+        with open(__file__, 'r', encoding='utf-8') as f:
+            _builder_hash = payload_hash(f.read().replace(js_logic, ''))
+    return _builder_hash
+
+
+def payload_key(options, content=''):
+    """Cache key of the payload build_payload(options, content) would produce, or None if it can't tell."""
+    js = preprocess_js(js_logic, {'METRICS'} if options.metrics else set())
+    try:
+        head, formulas, tail = split_formulas(js)
+    except ValueError:
+        return None
+    ids = find_calculator_ids(content) if options.tree_shake else list(formulas)
+    return payload_hash(json.dumps({
+        'builder': builder_hash(),
+        'engine': payload_hash(head + tail),
+        'formulas': [[fid, payload_hash(formulas[fid])] for fid in ids if fid in formulas],
+        'options': [options.tree_shake, options.minify, options.mangle, options.lazy, options.metrics],
+    }))
+
+
+def post_key(options, content, key=None):
+    """Cache key of a built post: payload key, loader options, and the post outside its loader block."""
+    key = key or payload_key(options, content)
+    if key is None:
+        return None
+    body = content.split('<!-- OZ Calc')[0].rstrip()
+    return payload_hash(json.dumps([key, options.encoding, options.loader, options.boot, options.hex_fallback,
+                                    options.metrics, options.local_cache, payload_hash(body)]))
+
+
+class BuildCache:
+    """Size-bounded, least-recently-used cache of payloads and built posts in a directory."""
+
+    def __init__(self, path=BUILD_CACHE_DIR, max_bytes=BUILD_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+
+    def _read(self, name):
+        file = os.path.join(self.path, name)
+        try:
+            with open(file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(file)
+        except OSError:
+            pass
+        return data
+
+    def _write(self, name, data):
+        os.makedirs(self.path, exist_ok=True)
+        file = os.path.join(self.path, name)
+        # Write then rename, so a parallel batch never reads half an entry
+        tmp = f"{file}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp, file)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for entry in os.scandir(self.path):
+            if entry.name.endswith('.json'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, file in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(file)
+            except OSError:
+                pass
+            total -= size
+
+    def get_payload(self, key):
+        data = self._read(f"payload-{key}.json")
+        return Payload(**data) if data else None
+
+    def put_payload(self, key, payload):
+        self._write(f"payload-{key}.json", asdict(payload))
+
+    def is_current(self, key, content):
+        """True if content is exactly the post this key last built."""
+        data = self._read(f"post-{key}.json")
+        return bool(data) and data.get('hash') == payload_hash(content)
+
+    def put_post(self, key, content):
+        self._write(f"post-{key}.json", {'hash': payload_hash(content)})
+
+
+def build_payload(options, content='', js=None, log=print, cache=None):
+    """Run the JS through the build pipeline and encode it.
+
+    content is the post HTML (only read by tree shaking); js defaults to the engine and
+    formulas above. Progress goes to log; failures raise BuildError. With a BuildCache,
+    a payload built before from the same inputs is reused instead.
+    """
+    key = payload_key(options, content) if cache is not None and js is None else None
+    if key is not None:
+        payload = cache.get_payload(key)
+        if payload is not None:
+            log(f"Build cache: reusing payload {key}")
+            return payload
+        payload = build_payload(options, content, log=log)
+        cache.put_payload(key, payload)
+        return payload
+
+    js = preprocess_js(js_logic if js is None else js, {'METRICS'} if options.metrics else set())
+
+    if options.tree_shake:
+        used_ids = find_calculator_ids(content)
+        try:
+            head, formulas, tail = split_formulas(js)
+        except ValueError as e:
+            raise BuildError(f"Tree shake failed: {e}")
+
+        missing = [fid for fid in used_ids if fid not in formulas]
+        for fid in missing:
+            log(f"Warning: No formula for calculator {fid}.")
+
+        full_size = len(js.encode('utf-8')) * 2
+        kept = {fid: formulas[fid] for fid in used_ids if fid in formulas}
+        js = join_formulas(head, kept, tail)
+        shaken_size = len(js.encode('utf-8')) * 2
+
+        log(f"Tree Shake: kept {len(kept)}/{len(formulas)} formulas ({', '.join(kept)})")
+        log(f"Tree Shake: saved {full_size - shaken_size} hex bytes ({full_size} -> {shaken_size}, -{100 * (full_size - shaken_size) / full_size:.1f}%)")
+
+    check_js(js)
+
+    # Minify (Rule 15: report the size delta so a broken build stands out)
+    if options.minify or options.mangle:
+        source_size = len(js.encode('utf-8'))
+        try:
+            js = mangle_js(js) if options.mangle else minify_js(js)
+        except ValueError as e:
+            raise BuildError(f"Minify failed: {e}")
+        minified_size = len(js.encode('utf-8'))
+        log(f"Minify{' + mangle' if options.mangle else ''}: {source_size} -> {minified_size} bytes of JS "
+            f"({2 * source_size} -> {2 * minified_size} hex, -{100 * (source_size - minified_size) / source_size:.1f}%)")
+
+    # Lazy formulas: the engine core stays in #oz-safe-code, formulas move to a #oz-safe-chunks-* store
+    chunk_store = chunk_payload = None
+    if options.lazy:
+        try:
+            head, formulas, tail = split_formulas(js)
+        except ValueError as e:
+            raise BuildError(f"Lazy split failed: {e}")
+        chunk_store, chunk_payload, chunk_index = encode_chunks(formulas)
+        js = (f"window.OZ_CHUNKS = Object.assign(window.OZ_CHUNKS || {{}}, {json.dumps(chunk_index, separators=(',', ':'))});\n"
+              + join_formulas(head, {}, tail))
+        log(f"Lazy: {len(formulas)} formula chunks ({len(chunk_payload)} hex), decoded on first interaction")
+
+    return Payload(js, encode_hex(js), encode_deflate(js), chunk_store, chunk_payload)
+
+
+def report_sizes(payload, options, log=print):
+    # Side-by-side sizes (bytes of HTML attribute value)
+    sizes = [
+        ("hex", len(payload.hex)),
+        ("deflate", len(payload.deflate)),
+        ("deflate+hex", len(payload.deflate) + len(payload.hex)),
+    ]
+    shipped = 'deflate+hex' if options.encoding == 'deflate' and options.hex_fallback else options.encoding
+    log("Encoding       Payload   vs hex")
+    for name, size in sizes:
+        marker = " <" if name == shipped else ""
+        log(f"{name:<12} {size:>9}   {100 * size / len(payload.hex):5.1f}%{marker}")
+
+    # Final Verification
+    log(f"Payload Length: {len(payload.hex)}")
+    log(f"Sample: {payload.hex[:50]}...")
+
+
+# Hex decoders, shared by the loaders and the decode bench.
+# v13: one substr + parseInt + string concat per byte; bytes >= 0x80 come out as Latin-1 (mangles µ, γ, θ).
+# v14: nibbles straight from charCodeAt into a preallocated Uint8Array, then one TextDecoder (UTF-8) call.
+HEX_DECODE_V13 = """function(v){var s="";for(var i=0;i<v.length;i+=2)s+=String.fromCharCode(parseInt(v.substr(i,2),16));return s}"""
+HEX_DECODE_V14 = """function(v){var n=v.length>>1,b=new Uint8Array(n),c,k;for(var i=0,j=0;i<n;i++,j+=2){c=v.charCodeAt(j);k=v.charCodeAt(j+1);b[i]=((c&15)+(c>>6)*9)<<4|((k&15)+(k>>6)*9)}return new TextDecoder().decode(b)}"""
 
-# Final Verification
-print(f"Payload Length: {len(hex_payload)}")
-print(f"Sample: {hex_payload[:50]}...")
-
-# Injection Logic
 # Level 5 Loader: Timeout Decoupled
 loader_script_v13_reactive = """<script>!function(){if(!window.ozExecuteCalc)window.ozExecuteCalc=function(){console.warn("OZ: Loading...")};function l(){setTimeout(function(){var e=document.getElementById("oz-safe-code");if(e){var v=e.value;if(v&&v.length%2===0){var s="";for(var i=0;i<v.length;i+=2)s+=String.fromCharCode(parseInt(v.substr(i,2),16));window.eval(s)}}}, 500)}if(document.readyState==="loading")document.addEventListener("DOMContentLoaded",l);else l();}();</script>"""
 
-loader_html = f"""<!-- OZ Calc v13.0 Reactive (Auto-Calc) -->
-<div class="oz-calculator-app" style="font-size:0;line-height:0;margin:0;padding:0;display:inline;">
-<input type="hidden" id="oz-safe-code" value="{hex_payload}">
-{loader_script_v13_reactive}
-<style>.oz-calculator-app {{ margin:0; padding:0; font-size:0; line-height:0; }}.itb-outputs {{ display: block; margin-top: 20px; padding: 15px; background: #f0fdf4; border: 1px solid #16a34a; border-radius: 6px; font-size: 16px; line-height: 1.5; }}.itb-output-group {{ margin-bottom: 8px; display: flex; justify-content: space-between; border-bottom: 1px dashed #bbf7d0; padding-bottom: 4px; }}.itb-output-group:last-child {{ border-bottom: none; }}</style>
-</div>"""
-
-loader_html = re.sub(r'\n', '', loader_html)
-
-# Read original
-with open('errorpost.html', 'r', encoding='utf-8') as f:
-    content = f.read()
-
-# Strip existing loader blocks (Aggressive)
-# We look for the marker, or just the bottom section
-if '<!-- OZ Calc' in content:
-    content = content.split('<!-- OZ Calc')[0]
-
-# Strip existing loader blocks (Aggressive)
-# We look for the marker, or just the bottom section
-if '<!-- OZ Calc' in content:
-    content = content.split('<!-- OZ Calc')[0]
-
-# Hide Buttons (Don't delete, just hide)
-# This appeases WP auto-formatters that might try to "fix" a missing button
-# content = re.sub(r'<button', r'<button style="display:none !important;"', content)
-
-# Strip any trailing newlines
-content = content.rstrip()
+# Level 5 Loader v14: assembled from parts so encoding and boot strategy can be picked per post.
+# Every part is ES5 with no regex literals (Rule 6: filters strip them).
+LOADER_PRELUDE = """if(!window.ozExecuteCalc)window.ozExecuteCalc=function(){console.warn("OZ: Loading...")};"""
+
+# x(s): crash-isolated execution. The payload runs in its own task, so a plugin that
+# throws earlier can't take it down, and a throw inside the payload can't take them down.
+# A payload that evaluated cleanly is handed to the cache as well (k: its data-oz-hash).
+LOADER_EXEC = """function x(s,k){setTimeout(function(){try{window.eval(s);if(k)w(k,s)}catch(err){console.error("OZ:",err)}},0)}"""
+
+# c(k, f) / w(k, s): decoded payloads in localStorage under "oz:<data-oz-hash>" (--local-cache,
+# opt-in), so a repeat visit skips the hex/deflate decode. Any script on the origin can write
+# that key, so c() recomputes the hash of the stored source (SHA-256, first 16 hex, as
+# payload_hash) and only hands it to f if it matches k; a mismatch is deleted and f() decodes
+# as usual, as it does without crypto.subtle (plain-http pages). "oz:index" lists the hashes
+# most recent first; past the first LOADER_CACHE_SIZE the oldest are evicted, so superseded
+# builds age out. Storage errors (private mode, quota) just mean no caching.
+LOADER_CACHE_SIZE = 4
+LOADER_CACHE = {
+    'local': """var P="oz:";function c(k,f){var s;try{s=k&&localStorage.getItem(P+k)}catch(err){}if(!s||!window.crypto||!crypto.subtle||!window.TextEncoder)return f();crypto.subtle.digest("SHA-256",new TextEncoder().encode(s)).then(function(b){var a=new Uint8Array(b),o="";for(var i=0;i<8;i++)o+=(a[i]<16?"0":"")+a[i].toString(16);if(o!==k){try{localStorage.removeItem(P+k)}catch(err){}return f()}w(k);f(s)},function(){f()})}function w(k,s){try{var n=JSON.parse(localStorage.getItem(P+"index")||"[]").filter(function(h){return h!==k});n.unshift(k);while(n.length>""" + str(LOADER_CACHE_SIZE) + """)localStorage.removeItem(P+n.pop());if(s)localStorage.setItem(P+k,s);localStorage.setItem(P+"index",JSON.stringify(n))}catch(err){}}""",
+    'none': """function c(k,f){f()}function w(){}""",
+}
+
+# r(): find, decode and hand the payload to x()
+LOADER_RUN = {
+    # Every input[id="oz-safe-code"] on the page (archive pages repeat the ID), each payload
+    # hash evaluated once per page via window.OZ_RUN. Deflate inputs are left to the deflate loader.
+    'hex': """var d=""" + HEX_DECODE_V14 + """;function r(){var q=document.querySelectorAll('input[id="oz-safe-code"]'),R=window.OZ_RUN=window.OZ_RUN||{},e,v,k,H;for(var i=0;i<q.length;i++){e=q[i];v=e.value;H=e.getAttribute("data-oz-hash");k=H||v;if(R[k]||e.getAttribute("data-oz-enc"))continue;R[k]=1;o(v,H)}}function o(v,H){c(H,function(s){if(s)x(s);else if(v&&v.length%2===0)x(d(v),H)})}""",
+    # Deflate: base64url -> DecompressionStream, hex fallback from the #oz-safe-code-hex right after it
+    'deflate': """var d=""" + HEX_DECODE_V14 + """;function y(v,k){if(v&&v.length%2===0)x(d(v),k)}function h(e,k){var f=e.nextElementSibling;if(!f||f.id!=="oz-safe-code-hex")return console.warn("OZ: DecompressionStream unavailable and no hex fallback");y(f.value,k)}function z(v){var b=atob(v.split("-").join("+").split("_").join("/")),u=new Uint8Array(b.length);for(var i=0;i<b.length;i++)u[i]=b.charCodeAt(i);return new Response(new Blob([u]).stream().pipeThrough(new DecompressionStream("deflate"))).text()}function f(e,k){z(e.value).then(function(s){x(s,k)},function(err){console.error(err);h(e,k)})}function r(){var q=document.querySelectorAll('input[id="oz-safe-code"]'),R=window.OZ_RUN=window.OZ_RUN||{},e,v,k,H;for(var i=0;i<q.length;i++){e=q[i];v=e.value;H=e.getAttribute("data-oz-hash");k=H||v;if(R[k])continue;R[k]=1;o(e,v,H)}}function o(e,v,H){c(H,function(s){if(s)x(s);else if(e.getAttribute("data-oz-enc")!=="deflate")y(v,H);else if(!window.DecompressionStream)h(e,H);else f(e,H)})}""",
+}
+
+# l(): when to call r() once the DOM is parsed ("Plugin Shield", Rule 7.4)
+LOADER_BOOT = {
+    # Flat 500 ms delay (the v13 behaviour)
+    'timeout': """function l(){setTimeout(r,500)}""",
+    # First of: browser idle (2 s cap), or the user touching/focusing a calculator
+    'adaptive': """function l(){var b=0,E=["focusin","pointerdown","touchstart"],i;function g(){if(b)return;b=1;for(var i=0;i<E.length;i++)document.removeEventListener(E[i],t,!0);r()}function t(e){if(e.target.closest&&e.target.closest("[data-itb-calculator]"))g()}for(i=0;i<E.length;i++)document.addEventListener(E[i],t,{capture:!0,passive:!0});window.requestIdleCallback?requestIdleCallback(g,{timeout:2000}):setTimeout(g,1)}""",
+    # Straight after DOMContentLoaded (still in its own task via x)
+    'immediate': """function l(){r()}""",
+}
+
+
+# --metrics: time decode and eval into window.OZ_METRICS (ms, summed over payloads) with
+# performance.mark/measure. Comes after LOADER_RUN: it wraps d() (and z() for deflate) and
+# redeclares x(), which wins over LOADER_EXEC's as the later declaration.
+LOADER_METRICS_BASE = """var M=window.OZ_METRICS=window.OZ_METRICS||{};M.decode=M.decode||0;M.eval=M.eval||0;function m(n){performance.mark(n+":end");performance.measure(n,n+":start",n+":end");var e=performance.getEntriesByName(n,"measure");return e[e.length-1].duration}var D=d;d=function(v){performance.mark("oz:decode:start");var s=D(v);M.decode+=m("oz:decode");return s};function x(s,k){setTimeout(function(){performance.mark("oz:eval:start");try{window.eval(s);if(k)w(k,s)}catch(err){console.error("OZ:",err)}M.eval+=m("oz:eval")},0)}"""
+LOADER_METRICS = {
+    'hex': LOADER_METRICS_BASE,
+    'deflate': LOADER_METRICS_BASE + """var Z=z;z=function(v){performance.mark("oz:inflate:start");return Z(v).then(function(s){M.decode+=m("oz:inflate");return s})};""",
+}
+
+
+def build_loader(encoding='hex', boot='adaptive', cache='local', metrics=False):
+    return ("<script>!function(){" + LOADER_PRELUDE + LOADER_EXEC + LOADER_CACHE[cache] + LOADER_RUN[encoding]
+            + (LOADER_METRICS[encoding] if metrics else '') + LOADER_BOOT[boot]
+            + """if(document.readyState==="loading")document.addEventListener("DOMContentLoaded",l);else l();}();</script>""")
+
+
+# Decode Bench: v13 vs v14 on the real payload
+DECODE_BENCH_JS = """var v13=""" + HEX_DECODE_V13 + """,v14=""" + HEX_DECODE_V14 + """;
+function ozBench(hex, src, runs, log) {
+    function time(f) { f(hex); var t = performance.now(); for (var i = 0; i < runs; i++) f(hex); return (performance.now() - t) / runs; }
+    var a = time(v13), b = time(v14);
+    log('payload: ' + hex.length + ' hex chars, ' + runs + ' runs each');
+    log('v13 decode: ' + a.toFixed(3) + ' ms' + (v13(hex) === src ? '' : '  (output differs from source: non-ASCII mangled)'));
+    log('v14 decode: ' + b.toFixed(3) + ' ms' + (v14(hex) === src ? '' : '  (output differs from source!)'));
+    log('speedup: ' + (a / b).toFixed(1) + 'x');
+}
+"""
 
-# Inject
-final_content = content + "\n" + loader_html
 
-with open('errorpost.html', 'w', encoding='utf-8') as f:
-    f.write(final_content)
+def run_decode_bench(hex_payload, js, html_path, runs=20):
+    """Write a self-contained browser bench page and, if node is available, run it here too."""
+    call = f"ozBench({json.dumps(hex_payload)}, {json.dumps(js)}, {runs}, log);"
+    with open(html_path, 'w', encoding='utf-8') as f:
+        f.write("<!doctype html><meta charset=\"utf-8\"><title>OZ decode bench</title><pre id=\"out\"></pre>"
+                "<script>function log(s){document.getElementById('out').textContent+=s+'\\n'}\n"
+                + DECODE_BENCH_JS + call + "</script>\n")
+    print(f"Decode bench page written to {html_path} (open it in the browsers you care about).")
+
+    node = shutil.which('node')
+    if not node:
+        print("node not found: skipping the local run.")
+        return
+    script = "var log = console.log;\n" + DECODE_BENCH_JS + call
+    result = subprocess.run([node, '-'], input=script, capture_output=True, text=True, encoding='utf-8')
+    print(f"node {subprocess.run([node, '--version'], capture_output=True, text=True).stdout.strip()}:")
+    print(result.stdout.rstrip() or result.stderr.rstrip())
+
+
+def build_loader_html(payload, options, log=print):
+    """The block appended to the post: marker comment, payload inputs, loader script and styles."""
+    if options.loader == 'v13':
+        if options.encoding != 'hex' or options.boot != 'timeout':
+            log("Warning: --loader v13 is hex + 500 ms timeout only; ignoring --encoding/--boot.")
+        payload_inputs = f'<input type="hidden" id="oz-safe-code" value="{payload.hex}">'
+        loader_script = loader_script_v13_reactive
+        loader_marker = "<!-- OZ Calc v13.0 Reactive (Auto-Calc) -->"
+    else:
+        payload_inputs = f'<input type="hidden" id="oz-safe-code" data-oz-hash="{payload.hash}" value="{payload.hex}">'
+        if options.encoding == 'deflate':
+            payload_inputs = f'<input type="hidden" id="oz-safe-code" data-oz-enc="deflate" data-oz-hash="{payload.hash}" value="{payload.deflate}">'
+            if options.hex_fallback:
+                payload_inputs += f'\n<input type="hidden" id="oz-safe-code-hex" value="{payload.hex}">'
+        loader_script = build_loader(options.encoding, options.boot, 'local' if options.local_cache else 'none', options.metrics)
+        loader_marker = f"<!-- OZ Calc v14.0 Reactive (Auto-Calc{', Deflate' if options.encoding == 'deflate' else ''}, Boot: {options.boot}{', Metrics' if options.metrics else ''}) -->"
+
+    if payload.chunks is not None:
+        payload_inputs += f'\n<input type="hidden" id="{payload.chunk_store}" value="{payload.chunks}">'
+
+    loader_html = f"""{loader_marker}
+<div class="oz-calculator-app" style="font-size:0;line-height:0;margin:0;padding:0;display:inline;">
+{payload_inputs}
+{loader_script}
+<style>.oz-calculator-app {{ margin:0; padding:0; font-size:0; line-height:0; }}.itb-outputs {{ display: block; margin-top: 20px; padding: 15px; background: #f0fdf4; border: 1px solid #16a34a; border-radius: 6px; font-size: 16px; line-height: 1.5; }}.itb-output-group {{ margin-bottom: 8px; display: flex; justify-content: space-between; border-bottom: 1px dashed #bbf7d0; padding-bottom: 4px; }}.itb-output-group:last-child {{ border-bottom: none; }}[data-itb-calculator] [aria-invalid="true"] {{ outline: 2px solid #f59e0b; }}</style>
+</div>"""
 
-print("INJECTION COMPLETE: Updated errorpost.html with v5 Payload (data-var support).")
+    return re.sub(r'\n', '', loader_html)
+
+
+def inject(content, loader_html):
+    """Replace the post's loader block (everything from the first OZ Calc marker on) with loader_html."""
+    # Strip existing loader blocks (Aggressive)
+    # We look for the marker, or just the bottom section
+    if '<!-- OZ Calc' in content:
+        content = content.split('<!-- OZ Calc')[0]
+
+    # Hide Buttons (Don't delete, just hide)
+    # This appeases WP auto-formatters that might try to "fix" a missing button
+    # content = re.sub(r'<button', r'<button style="display:none !important;"', content)
+
+    # Strip any trailing newlines
+    content = content.rstrip()
+
+    # Inject
+    return content + "\n" + loader_html
+
+
+def validate_post(html):
+    """Golden Egg check (Rule 17) on a built post: a list of problems, empty when it looks shippable."""
+    problems = []
+    if html.count('<!-- OZ Calc') != 1:
+        problems.append(f"expected one OZ Calc loader block, found {html.count('<!-- OZ Calc')}")
+    if not re.search(r'<input type="hidden" id="oz-safe-code"[^>]* value="[^"]+"', html):
+        problems.append('no <input id="oz-safe-code"> payload')
+    if '<script>!function(){' not in html.split('<!-- OZ Calc')[-1]:
+        problems.append("no loader script after the marker")
+    for fid in find_calculator_ids(html):
+        if f'"{fid}"' not in js_logic:
+            problems.append(f"no formula for calculator {fid}")
+    return problems
+
+
+def build_post(content, options=None, log=print, cache=None):
+    """In-process build: post HTML in, post HTML with a fresh payload and loader out."""
+    options = options or BuildOptions()
+    payload = build_payload(options, content, log=log, cache=cache)
+    return inject(content, build_loader_html(payload, options, log=log))
+
+
+def add_build_arguments(parser):
+    """The flags that map onto BuildOptions (shared with batch_build.py)."""
+    parser.add_argument('--tree-shake', action='store_true', help="Only ship the formulas whose calculators appear in the post")
+    parser.add_argument('--minify', action='store_true', help="Strip comments and whitespace from the JS before encoding")
+    parser.add_argument('--mangle', action='store_true', help="Minify and also shorten local identifiers")
+    parser.add_argument('--lazy', action='store_true', help="Ship each formula as its own chunk, decoded the first time its calculator is used")
+    parser.add_argument('--encoding', choices=['hex', 'deflate'], default='hex',
+                        help="Payload encoding (default: hex). deflate ships about 20%% of the hex size, but browsers "
+                             "without DecompressionStream get no calculators unless --hex-fallback adds the hex copy "
+                             "back (about 120%% of hex-only)")
+    parser.add_argument('--loader', choices=['v13', 'v14'], default='v14', help="Hex loader generation (default: v14, TextDecoder)")
+    parser.add_argument('--boot', choices=['adaptive', 'timeout', 'immediate'], default='adaptive',
+                        help="When the loader runs the payload: first of idle/interaction (default), flat 500 ms, or right after DOMContentLoaded")
+    parser.add_argument('--hex-fallback', action='store_true',
+                        help="deflate only: also ship the hex copy for browsers without DecompressionStream (adds the full hex size back)")
+    parser.add_argument('--metrics', action='store_true', help="Instrumented build: decode/eval/boot/formula timings on window.OZ_METRICS")
+    parser.add_argument('--local-cache', action='store_true',
+                        help="v14 only: keep decoded payloads in the reader's localStorage (hash-checked before each use)")
+    parser.add_argument('--build-cache', metavar='DIR', default=BUILD_CACHE_DIR,
+                        help=f"Reuse payloads and skip unchanged posts via this cache directory (default: {BUILD_CACHE_DIR})")
+    parser.add_argument('--no-build-cache', action='store_true', help="Always rebuild, without reading or writing the build cache")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the OZ hex payload and inject it into a post.")
+    parser.add_argument('--post', default='errorpost.html', help="Post file to inject into (default: errorpost.html)")
+    parser.add_argument('--bench-decode', metavar='HTML', nargs='?', const='oz-decode-bench.html',
+                        help="Time the v13 and v14 hex decoders on this payload (writes a browser bench page, runs node if present) instead of injecting")
+    add_build_arguments(parser)
+    args = parser.parse_args(argv)
+
+    options = BuildOptions.from_args(args)
+
+    # Read original
+    with open(args.post, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    # Same builder, formulas, loader options and post text as the last build: nothing to do
+    cache = None if args.no_build_cache else BuildCache(args.build_cache)
+    key = post_key(options, content) if cache and not args.bench_decode else None
+    if key and cache.is_current(key, content):
+        print(f"UP TO DATE: {args.post} is unchanged since its last build (build cache); not rewritten.")
+        return 0
+
+    try:
+        payload = build_payload(options, content, cache=cache)
+    except BuildError as e:
+        print(f"FATAL ERROR: {e}")
+        return 1
+    report_sizes(payload, options)
+
+    if args.bench_decode:
+        run_decode_bench(payload.hex, payload.js, args.bench_decode)
+        return 0
+
+    final_content = inject(content, build_loader_html(payload, options))
+    for problem in validate_post(final_content):
+        print(f"Warning: {problem}")
+
+    if key:
+        cache.put_post(key, final_content)
+    if final_content == content:
+        print(f"UP TO DATE: {args.post} already carries this build; not rewritten.")
+        return 0
+
+    with open(args.post, 'w', encoding='utf-8') as f:
+        f.write(final_content)
+
+    print(f"INJECTION COMPLETE: Updated {args.post} with v5 Payload (data-var support).")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,7 @@
-import re
 import json
 
+from tool_scanner import scan
+
 # Read the HTML file
 try:
     with open('errorpost.html', 'r', encoding='utf-8') as f:
@@ -9,22 +10,18 @@ except FileNotFoundError:
     print("Error: errorpost.html not found.")
     exit(1)
 
-# Pattern to find the JSON within <pre ...><code class="itb-tool">
-# Adhering to Rule 12: Robust Regex for attributes
-pattern = r'<pre[^>]*><code class="itb-tool">\s*(.*?)\s*</code></pre>'
-matches = re.findall(pattern, content, re.DOTALL)
-
+# Tool definitions from <pre><code class="itb-tool"> blocks and enclosing [itb-tool] shortcodes.
+# The shared scanner has already unescaped HTML entities and parsed the JSON.
 tools_found = []
 
-for json_str in matches:
-    try:
-        # Clean up potential HTML entities if any (basic ones)
-        json_clean = json_str.replace('&lt;', '<').replace('&gt;', '>').replace('&amp;', '&')
-        tool_json = json.loads(json_clean)
-        tools_found.append(tool_json)
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON: {e}")
-        print(f"Problematic string: {json_str[:100]}...")
+for block in scan(content):
+    if block.kind not in ('pre', 'shortcode') or not block.text:
+        continue
+    if block.data is None:
+        print(f"Error decoding JSON: invalid tool JSON at byte {block.start}")
+        print(f"Problematic string: {block.text[:100]}...")
+        continue
+    tools_found.append(block.data)
 
 print(f"Found {len(tools_found)} tools.")
 
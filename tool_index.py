@@ -0,0 +1,222 @@
+import os
+import re
+import sys
+import json
+import zlib
+import base64
+import sqlite3
+import argparse
+import binascii
+
+from tool_scanner import scan, content_hash, parse_attrs, expand_paths
+from generate_hex_v5 import js_logic, split_formulas, payload_hash
+
+# Persistent index of tool blocks across posts (Rules 19 and 21 without a grep per post).
+# Each post is scanned once with tool_scanner; its blocks, and the formula IDs its payload
+# carries, go into a local SQLite file. Re-runs skip posts whose mtime and size are unchanged,
+# and only re-scan posts whose content hash changed.
+
+INDEX_DB = 'tool_index.sqlite'
+INDEX_SCHEMA_VERSION = 1
+
+INDEX_SCHEMA = """
+CREATE TABLE posts (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    payload_hash TEXT            -- data-oz-hash of the post's payload, NULL without one
+);
+CREATE TABLE blocks (
+    path TEXT NOT NULL REFERENCES posts(path) ON DELETE CASCADE,
+    kind TEXT NOT NULL,          -- pre | shortcode | placeholder | container
+    tool_id TEXT,
+    start INTEGER NOT NULL,      -- UTF-8 byte offsets, end exclusive
+    end INTEGER NOT NULL,
+    hash TEXT NOT NULL
+);
+CREATE TABLE payload_formulas (
+    path TEXT NOT NULL REFERENCES posts(path) ON DELETE CASCADE,
+    formula_id TEXT NOT NULL,
+    PRIMARY KEY (path, formula_id)
+);
+CREATE INDEX blocks_tool ON blocks(tool_id);
+CREATE INDEX blocks_path ON blocks(path, kind);
+CREATE INDEX payload_formulas_id ON payload_formulas(formula_id);
+"""
+
+PAYLOAD_INPUT = re.compile(r'<input type="hidden" id="oz-safe-code"[^>]*>')
+CHUNK_INDEX = re.compile(r"window\.OZ_CHUNKS = Object\.assign\(window\.OZ_CHUNKS \|\| \{\}, (\{.*?\})\);")
+
+
+def connect(path=INDEX_DB):
+    """Open (creating or rebuilding on a schema change) the index database."""
+    db = sqlite3.connect(path)
+    db.execute('PRAGMA foreign_keys = ON')
+    if db.execute('PRAGMA user_version').fetchone()[0] != INDEX_SCHEMA_VERSION:
+        for (table,) in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall():
+            db.execute(f'DROP TABLE {table}')
+        db.executescript(INDEX_SCHEMA)
+        db.execute(f'PRAGMA user_version = {INDEX_SCHEMA_VERSION}')
+        db.commit()
+    return db
+
+
+def decode_payload(post):
+    """(payload hash, JS) of the post's #oz-safe-code payload, or (None, None) if it has none."""
+    m = PAYLOAD_INPUT.search(post)
+    if m is None:
+        return None, None
+    attrs = parse_attrs(m.group())
+    value = attrs.get('value', '')
+    if attrs.get('data-oz-enc') == 'deflate':
+        js = zlib.decompress(base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))).decode('utf-8')
+    else:
+        js = binascii.unhexlify(value).decode('utf-8')
+    # v13 payloads carry no data-oz-hash; the hash is the same function of the JS
+    return attrs.get('data-oz-hash') or payload_hash(js), js
+
+
+def payload_formula_ids(js):
+    """Formula IDs shipped in a payload: inline ones, plus lazy chunks (--lazy)."""
+    try:
+        _, formulas, _ = split_formulas(js)
+        ids = list(formulas)
+    except ValueError:
+        ids = []
+    chunks = CHUNK_INDEX.search(js)
+    if chunks:
+        ids += [fid for fid in json.loads(chunks.group(1)) if fid not in ids]
+    return ids
+
+
+def index_post(db, path, log=print):
+    """Bring one post's rows up to date. Returns 'unchanged', 'touched', 'indexed' or 'failed'."""
+    try:
+        stat = os.stat(path)
+        row = db.execute('SELECT mtime, size, hash FROM posts WHERE path = ?', (path,)).fetchone()
+        if row and row[0] == stat.st_mtime and row[1] == stat.st_size:
+            return 'unchanged'
+        with open(path, 'rb') as f:
+            raw = f.read()
+    except OSError as e:
+        log(f"Warning: {path}: can't read it, skipped ({e}).")
+        db.execute('DELETE FROM posts WHERE path = ?', (path,))
+        return 'failed'
+    digest = content_hash(raw)
+    if row and row[2] == digest:
+        # Saved again without changes: remember the new mtime so the next run skips the read
+        db.execute('UPDATE posts SET mtime = ?, size = ? WHERE path = ?', (stat.st_mtime, stat.st_size, path))
+        return 'touched'
+
+    try:
+        post = raw.decode('utf-8')
+    except UnicodeDecodeError as e:
+        log(f"Warning: {path}: not UTF-8, skipped ({e}).")
+        # Drop any rows from an earlier, readable version; with no row the next run retries it
+        db.execute('DELETE FROM posts WHERE path = ?', (path,))
+        return 'failed'
+    try:
+        payload, js = decode_payload(post)
+    except (ValueError, zlib.error) as e:
+        log(f"Warning: {path}: payload doesn't decode ({e}).")
+        payload, js = None, None
+
+    db.execute('DELETE FROM posts WHERE path = ?', (path,))
+    db.execute('INSERT INTO posts VALUES (?, ?, ?, ?, ?)', (path, stat.st_mtime, stat.st_size, digest, payload))
+    db.executemany('INSERT INTO blocks VALUES (?, ?, ?, ?, ?, ?)',
+                   [(path, b.kind, b.tool_id, b.start, b.end, b.hash) for b in scan(post)])
+    if js is not None:
+        db.executemany('INSERT INTO payload_formulas VALUES (?, ?)',
+                       [(path, fid) for fid in payload_formula_ids(js)])
+    return 'indexed'
+
+
+def update(db, paths, log=print):
+    """Index paths incrementally and drop posts that no longer exist. Returns a count per outcome."""
+    counts = {'unchanged': 0, 'touched': 0, 'indexed': 0, 'failed': 0, 'removed': 0}
+    for path in paths:
+        counts[index_post(db, path, log)] += 1
+    for (path,) in db.execute('SELECT path FROM posts').fetchall():
+        if not os.path.exists(path):
+            db.execute('DELETE FROM posts WHERE path = ?', (path,))
+            counts['removed'] += 1
+    db.commit()
+    return counts
+
+
+# --- Queries ---
+
+def posts_with(db, tool_id):
+    """(path, kind, start) of every block for tool_id."""
+    return db.execute('SELECT path, kind, start FROM blocks WHERE tool_id = ? ORDER BY path, start',
+                      (tool_id,)).fetchall()
+
+
+def duplicates(db):
+    """(path, tool_id, count, kinds) where a post holds more than one block for a tool (Rule 19)."""
+    return db.execute("""SELECT path, tool_id, COUNT(*), GROUP_CONCAT(kind) FROM blocks
+                         WHERE tool_id IS NOT NULL GROUP BY path, tool_id HAVING COUNT(*) > 1
+                         ORDER BY path, tool_id""").fetchall()
+
+
+def missing_formulas(db):
+    """(path, tool_id) of calculators whose post payload doesn't ship their formula."""
+    return db.execute("""SELECT DISTINCT b.path, b.tool_id FROM blocks b
+                         WHERE b.kind = 'container' AND NOT EXISTS (
+                             SELECT 1 FROM payload_formulas f WHERE f.path = b.path AND f.formula_id = b.tool_id)
+                         ORDER BY b.path, b.tool_id""").fetchall()
+
+
+def unused_formulas(db, js=None):
+    """Formula IDs in the engine (js_logic by default) with no calculator in any indexed post."""
+    _, formulas, _ = split_formulas(js_logic if js is None else js)
+    used = {tid for (tid,) in db.execute("SELECT DISTINCT tool_id FROM blocks WHERE kind = 'container'")}
+    return [fid for fid in formulas if fid not in used]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index tool blocks across posts and query the index.")
+    parser.add_argument('posts', nargs='*', default=['errorpost.html'],
+                        help="Post files, directories or globs to (re)index (default: errorpost.html)")
+    parser.add_argument('--db', default=INDEX_DB, help=f"Index file (default: {INDEX_DB})")
+    parser.add_argument('--no-update', action='store_true', help="Query the index as it is, without re-indexing")
+    parser.add_argument('--tool', metavar='ID', help="List every block for this tool ID")
+    parser.add_argument('--duplicates', action='store_true', help="Posts holding a tool more than once (Rule 19)")
+    parser.add_argument('--missing-formulas', action='store_true', help="Calculators whose post payload lacks their formula")
+    parser.add_argument('--unused-formulas', action='store_true', help="Engine formulas no indexed post uses")
+    args = parser.parse_args(argv)
+
+    db = connect(args.db)
+    if not args.no_update:
+        counts = update(db, expand_paths(args.posts))
+        print(f"Indexed {counts['indexed']}, touched {counts['touched']}, unchanged {counts['unchanged']}, "
+              f"removed {counts['removed']}, failed {counts['failed']} posts.")
+
+    if args.tool:
+        rows = posts_with(db, args.tool)
+        print(f"{args.tool}: {len(rows)} blocks")
+        for path, kind, start in rows:
+            print(f"  {path} @{start} ({kind})")
+    if args.duplicates:
+        rows = duplicates(db)
+        print(f"Duplicates: {len(rows)}")
+        for path, tool_id, count, kinds in rows:
+            print(f"  {path}: {tool_id} x{count} ({kinds})")
+    if args.missing_formulas:
+        rows = missing_formulas(db)
+        print(f"Calculators without a formula: {len(rows)}")
+        for path, tool_id in rows:
+            print(f"  {path}: {tool_id}")
+    if args.unused_formulas:
+        ids = unused_formulas(db)
+        print(f"Unused formulas: {len(ids)}")
+        for fid in ids:
+            print(f"  {fid}")
+
+    db.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
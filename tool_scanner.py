@@ -0,0 +1,203 @@
+import os
+import re
+import glob
+import json
+import hashlib
+import html
+from typing import NamedTuple
+
+# One-pass scanner for tool blocks in a post (Rule 8). convert_legacy.py and scan_wet.py both
+# read posts through scan(), so every kind of block is found by the same code, in one walk.
+#
+# Kinds:
+#   pre          <pre><code class="itb-tool">{json}</code></pre> (a <pre> without the class is
+#                a code sample, whatever its JSON looks like)
+#   shortcode    [itb-tool id="..."] or [itb-tool]{json}[/itb-tool]
+#   placeholder  any element carrying data-itb-tool="..."
+#   container    a converted calculator: any element carrying data-itb-calculator="..."
+#
+# Offsets are UTF-8 byte offsets into the post (end exclusive); hash is over those bytes.
+
+
+class ToolBlock(NamedTuple):
+    kind: str
+    tool_id: str   # None when the block's JSON doesn't parse
+    start: int
+    end: int
+    hash: str
+    text: str      # entity-unescaped JSON of pre/shortcode blocks, '' otherwise
+    data: dict     # parsed JSON, or None
+
+
+# Tokens: comments, tags (quoted attribute values may contain ">"), and text runs
+HTML_TOKEN = re.compile(r"""
+    (?P<comment><!--.*?(?:-->|$))
+  | (?P<tag></?[A-Za-z][^\s/>]*(?:"[^"]*"|'[^']*'|[^'">])*>)
+  | (?P<text>[^<]+|<)
+""", re.S | re.X)
+
+HTML_TAG_NAME = re.compile(r"</?([A-Za-z][^\s/>]*)")
+HTML_ATTR = re.compile(r"""([^\s"'=<>/]+)(?:\s*=\s*("[^"]*"|'[^']*'|[^\s>]+))?""")
+
+# Never closed, so never pushed on the element stack
+HTML_VOID = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+# Raw text: "<" inside these (the loader's "i<q.length") is not markup
+HTML_RAW_TEXT = {'script', 'style', 'textarea'}
+
+SHORTCODE = re.compile(r"\[(/?)itb-tool\b([^\]]*)\]")
+
+
+def slugify(text):
+    return re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-')
+
+
+def content_hash(raw):
+    return hashlib.sha256(raw).hexdigest()[:16]
+
+
+def parse_attrs(tag):
+    """Attribute dict of a start tag, values entity-unescaped."""
+    body = HTML_TAG_NAME.sub('', tag, count=1).rstrip('>').rstrip('/')
+    attrs = {}
+    for name, value in HTML_ATTR.findall(body):
+        if value[:1] in ('"', "'"):
+            value = value[1:-1]
+        attrs[name.lower()] = html.unescape(value)
+    return attrs
+
+
+def tool_id_of(data):
+    """ID of a tool definition, falling back to the slug of its name (Rule 12)."""
+    if not isinstance(data, dict):
+        return None
+    return data.get('id') or slugify(data.get('name', 'tool'))
+
+
+def _json_block(kind, raw, start, end, text):
+    """A pre/shortcode record; data is None when the JSON doesn't parse to an object."""
+    text = text.strip()
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        data = None
+    return ToolBlock(kind, tool_id_of(data), start, end, content_hash(raw[start:end]), text, data)
+
+
+def scan(post):
+    """All tool blocks in post (str), in document order, as ToolBlock records."""
+    raw = post.encode('utf-8')
+    blocks = []
+    elements = []     # open placeholder/container elements: [tag name, depth, kind, tool id, start]
+    pre = None        # open <pre>: [start, text parts, has itb-tool code]
+    shortcode = None  # open [itb-tool]...[/itb-tool]: [start, text parts, attrs]
+    pos = 0           # byte offset of the current token
+    i = 0             # str offset of the current token
+
+    while i < len(post):
+        m = HTML_TOKEN.match(post, i)
+        token = m.group()
+        kind = m.lastgroup
+        if kind == 'tag' and not token.startswith('</'):
+            name = HTML_TAG_NAME.match(token).group(1).lower()
+            if name in HTML_RAW_TEXT:
+                # Step over the element's body as one token; its end tag is read next
+                close = re.compile('</' + name, re.I).search(post, m.end())
+                token = post[i:close.start() if close else len(post)]
+                kind = 'raw'
+        size = len(token.encode('utf-8'))
+        i += len(token)
+
+        if kind == 'tag':
+            name = HTML_TAG_NAME.match(token).group(1).lower()
+            closing = token.startswith('</')
+
+            if not closing:
+                attrs = parse_attrs(token)
+                if name == 'pre' and pre is None:
+                    pre = [pos, [], False]
+                elif name == 'code' and pre is not None and 'itb-tool' in attrs.get('class', '').split():
+                    pre[2] = True
+
+                for el in elements:
+                    if el[0] == name:
+                        el[1] += 1
+                tracked = ('container', attrs.get('data-itb-calculator')) if 'data-itb-calculator' in attrs \
+                    else ('placeholder', attrs.get('data-itb-tool')) if 'data-itb-tool' in attrs else None
+                if tracked:
+                    if name in HTML_VOID or token.endswith('/>'):
+                        blocks.append(ToolBlock(tracked[0], tracked[1], pos, pos + size,
+                                                content_hash(raw[pos:pos + size]), '', None))
+                    else:
+                        elements.append([name, 1, tracked[0], tracked[1], pos])
+            else:
+                if name == 'pre' and pre is not None:
+                    if pre[2]:
+                        blocks.append(_json_block('pre', raw, pre[0], pos + size, ''.join(pre[1])))
+                    pre = None
+                for el in list(elements):
+                    if el[0] != name:
+                        continue
+                    el[1] -= 1
+                    if el[1] == 0:
+                        elements.remove(el)
+                        blocks.append(ToolBlock(el[2], el[3], el[4], pos + size,
+                                                content_hash(raw[el[4]:pos + size]), '', None))
+
+        elif kind == 'text':
+            if pre is not None:
+                pre[1].append(html.unescape(token))
+            elif shortcode is not None or '[' in token:
+                # Shortcodes live in text; an enclosing one may span tags (wpautop adds <br>/<p>)
+                offset = 0
+                for sc in SHORTCODE.finditer(token):
+                    sc_start = pos + len(token[:sc.start()].encode('utf-8'))
+                    sc_end = pos + len(token[:sc.end()].encode('utf-8'))
+                    if shortcode is not None:
+                        shortcode[1].append(html.unescape(token[offset:sc.start()]))
+                    if sc.group(1) and shortcode is not None:
+                        attrs, start, text = shortcode[2], shortcode[0], ''.join(shortcode[1])
+                        shortcode = None
+                        if text.strip():
+                            block = _json_block('shortcode', raw, start, sc_end, text)
+                            if block.data is None:
+                                # Body isn't JSON (wpautop residue, a typo): the id attribute still names the tool
+                                block = block._replace(tool_id=attrs.get('id'))
+                        else:
+                            block = ToolBlock('shortcode', attrs.get('id'), start, sc_end,
+                                              content_hash(raw[start:sc_end]), '', None)
+                        blocks.append(block)
+                    elif not sc.group(1):
+                        # A new opening tag first closes any unterminated one as self-closing
+                        if shortcode is not None:
+                            blocks.append(_self_closing(raw, shortcode))
+                        shortcode = [sc_start, [], parse_attrs('<x ' + sc.group(2) + '>'), sc_end]
+                    offset = sc.end()
+                if shortcode is not None:
+                    shortcode[1].append(html.unescape(token[offset:]))
+
+        pos += size
+
+    if shortcode is not None:
+        blocks.append(_self_closing(raw, shortcode))
+    blocks.sort(key=lambda b: b.start)
+    return blocks
+
+
+def _self_closing(raw, shortcode):
+    start, _, attrs, end = shortcode
+    return ToolBlock('shortcode', attrs.get('id'), start, end, content_hash(raw[start:end]), '', None)
+
+
+def expand_paths(specs):
+    """Post files named by specs: files, directories (every *.html below) and globs, sorted."""
+    paths = set()
+    for spec in specs:
+        if os.path.isdir(spec):
+            paths.update(glob.glob(os.path.join(spec, '**', '*.html'), recursive=True))
+        elif glob.has_magic(spec):
+            paths.update(glob.glob(spec, recursive=True))
+        else:
+            paths.add(spec)
+    return sorted(os.path.normpath(p) for p in paths)